@@ -6,6 +6,7 @@ from datetime import timedelta, datetime
 
 from flask import Flask, session, flash, redirect, url_for, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, raiseload
 from flask_migrate import Migrate
 from flask_wtf import CSRFProtect
 from flask_login import LoginManager, current_user, logout_user
@@ -14,6 +15,7 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 
 from .config import Config
+from .json_provider import ORJSONProvider
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -60,6 +62,20 @@ def create_app():
     os.makedirs(upload_dir, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = upload_dir
 
+    # Stockage des sessions : Redis si REDIS_URL est défini, sinon fichiers locaux
+    session_backend = {'SESSION_TYPE': 'filesystem'}
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        try:
+            import redis
+            session_backend = {
+                'SESSION_TYPE': 'redis',
+                'SESSION_REDIS': redis.from_url(redis_url)
+            }
+            logger.info("»»»» Sessions stockées dans Redis")
+        except ImportError:
+            logger.warning("»»»» REDIS_URL défini mais module redis manquant, sessions sur disque")
+    
     # Configuration des sessions et cookies
     logger.info("»»»» Configuration des sessions et cookies")
     app.config.update(
@@ -67,7 +83,7 @@ def create_app():
         SESSION_COOKIE_SECURE=False,
         SESSION_COOKIE_HTTPONLY=True,
         SESSION_COOKIE_SAMESITE='Lax',
-        SESSION_TYPE='filesystem',
+        **session_backend,
         REMEMBER_COOKIE_DURATION=timedelta(days=1),
         REMEMBER_COOKIE_SECURE=False,
         REMEMBER_COOKIE_HTTPONLY=True,
@@ -81,6 +97,9 @@ def create_app():
     app.config.from_object(Config)
     Config.init_app(app)
     
+    # Sérialisation JSON via orjson pour tous les jsonify()
+    app.json = ORJSONProvider(app)
+    
     # Initialisation des extensions
     logger.info("»»»» Initialisation de la base de données")
     db.init_app(app)
@@ -103,10 +122,16 @@ def create_app():
         # Ajouter le chargeur d'utilisateur pour Flask-Login
         from .models import User
         
+        # Options de chargement de current_user : settings par jointure ; en DEBUG,
+        # toute autre relation chargée paresseusement lève une erreur (N+1 repérés tôt)
+        user_load_options = [joinedload(User.settings)]
+        if app.debug:
+            user_load_options.append(raiseload('*'))
+        
         @login_manager.user_loader
         def load_user(user_id):
             try:
-                return User.query.get(int(user_id))
+                return User.query.options(*user_load_options).get(int(user_id))
             except Exception as e:
                 logger.error(f"Erreur lors du chargement de l'utilisateur {user_id}: {str(e)}")
                 return None
@@ -144,6 +169,11 @@ def create_app():
         try:
             db.create_all()
             logger.info("»»»» Structure de la base de données créée ou vérifiée")
+            # Créer les lignes singleton (Settings, BotResponses...) ici plutôt
+            # qu'au premier GET, pour que les routes de lecture n'écrivent jamais
+            from .models import ensure_log_indexes, init_default_data
+            ensure_log_indexes()
+            init_default_data()
         except Exception as e:
             logger.error(f"»»»» Erreur lors de l'initialisation de la base de données: {str(e)}", exc_info=True)
 
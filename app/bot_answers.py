@@ -7,6 +7,10 @@ import unicodedata
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
+# Motifs de normalisation compilés une seule fois
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9\s]')
+_SPACES_RE = re.compile(r'\s+')
+
 # Cache pour les infos du bot avec TTL
 _bot_info_cache = {
     "data": None,
@@ -34,10 +38,10 @@ def normalize_text(text: str) -> str:
     text = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8')
     
     # Supprimer les caractères spéciaux (garder uniquement lettres, chiffres et espaces)
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
+    text = _NON_ALNUM_RE.sub(' ', text)
     
     # Remplacer les espaces multiples par un seul espace
-    text = re.sub(r'\s+', ' ', text)
+    text = _SPACES_RE.sub(' ', text)
     
     return text.strip()
 
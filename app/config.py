@@ -120,6 +120,7 @@ class Config:
     # Dossiers pour upload utilisateur
     UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_IMPORT_SIZE = 2 * 1024 * 1024  # 2MB max pour les imports JSON
     
     # Extensions autorisées pour les avatars
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif'}
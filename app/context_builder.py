@@ -1,6 +1,7 @@
 import logging
 import json
 import re
+import time
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
@@ -8,13 +9,26 @@ from flask_login import current_user
 
 from .models import (
     Settings, BotResponses, DefaultMessage, FAQ, 
-    ResponseRule, BotCompetences, Document
+    ResponseRule, BotCompetences, Document, on_commit
 )
 from .fast_responses_cache import get_fast_response, process_variables
 from .knowledge_integrator import KnowledgeIntegrator
 
 logger = logging.getLogger(__name__)
 
+# Identité du bot (nom, description...) : lue à chaque message mais modifiée rarement
+_bot_info_cache = {'data': None, 'timestamp': 0}
+BOT_INFO_CACHE_TTL = 60  # secondes, filet de sécurité pour les écritures hors ORM
+
+
+def _invalidate_bot_info():
+    _bot_info_cache['data'] = None
+
+
+# Après commit seulement : invalidé au flush, le cache serait re-rempli avec l'ancienne ligne
+on_commit(Settings, _invalidate_bot_info)
+
+
 class ContextBuilder:
     """
     Classe responsable de construire un contexte riche pour l'IA
@@ -235,7 +249,20 @@ class ContextBuilder:
         """
         Récupère les informations de base du bot depuis les PARAMÈTRES GÉNÉRAUX.
         PRIORITÉ ABSOLUE aux paramètres configurés par l'utilisateur.
+        Mis en cache, invalidé après chaque commit touchant Settings. Renvoie une
+        copie : le dict en cache est partagé entre requêtes et threads.
         """
+        cached = _bot_info_cache['data']
+        if cached is not None and time.monotonic() - _bot_info_cache['timestamp'] < BOT_INFO_CACHE_TTL:
+            return dict(cached)
+        
+        bot_info = self._load_bot_info()
+        _bot_info_cache['data'] = bot_info
+        _bot_info_cache['timestamp'] = time.monotonic()
+        return dict(bot_info)
+    
+    def _load_bot_info(self) -> Dict[str, str]:
+        """Lit l'identité du bot en base (voir _get_bot_info pour la version mise en cache)."""
         # CORRECTION : Utiliser les Settings généraux pour nom/description/avatar
         # Ces paramètres sont configurés dans "Paramètres Généraux", pas par utilisateur
         general_settings = Settings.query.filter_by(user_id=None).first()
@@ -286,10 +313,10 @@ class ContextBuilder:
         default_messages = DefaultMessage.query.all()
         
         for message in default_messages:
-            if not message.triggers:
+            if not message.trigger_list:
                 continue
                 
-            triggers = [t.strip().lower() for t in message.triggers.split(',')]
+            triggers = [t.lower() for t in message.trigger_list]
             relevance_score = 0
             
             for trigger in triggers:
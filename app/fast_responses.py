@@ -27,7 +27,7 @@ def get_all_responses():
                 'id': r.id,
                 'title': r.title,
                 'content': r.content,
-                'triggers': r.triggers.split(',') if r.triggers else [],
+                'triggers': r.trigger_list,
                 'created_at': r.created_at.isoformat() if r.created_at else None,
                 'updated_at': r.updated_at.isoformat() if r.updated_at else None
             }
@@ -48,7 +48,7 @@ def get_response(id):
             'id': response.id,
             'title': response.title,
             'content': response.content,
-            'triggers': response.triggers.split(',') if response.triggers else [],
+            'triggers': response.trigger_list,
             'created_at': response.created_at.isoformat() if response.created_at else None,
             'updated_at': response.updated_at.isoformat() if response.updated_at else None
         }
@@ -68,16 +68,11 @@ def create_response():
     if not data.get('content'):
         return jsonify({'status': 'error', 'message': 'Le contenu est obligatoire'}), 400
     
-    # Convertir les triggers en chaîne
-    triggers = data.get('triggers', [])
-    if isinstance(triggers, list):
-        triggers = ','.join(triggers)
-    
     # Créer la réponse
     new_response = DefaultMessage(
         title=data.get('title'),
         content=data.get('content'),
-        triggers=triggers
+        trigger_list=data.get('triggers', [])
     )
     
     # Enregistrer
@@ -87,9 +82,9 @@ def create_response():
     # Rafraîchir le cache
     logger.info("===> Tentative de rafraîchissement du cache")
     try:
-        from .fast_responses_cache import refresh_cache
-        refresh_cache()
-        logger.info("===> Cache rafraîchi avec succès")
+        from .fast_responses_cache import schedule_refresh
+        schedule_refresh()
+        logger.info("===> Rafraîchissement du cache planifié")
     except Exception as e:
         logger.error(f"===> Erreur lors du rafraîchissement du cache: {str(e)}", exc_info=True)
     
@@ -100,7 +95,7 @@ def create_response():
             'id': new_response.id,
             'title': new_response.title,
             'content': new_response.content,
-            'triggers': new_response.triggers.split(',') if new_response.triggers else [],
+            'triggers': new_response.trigger_list,
             'created_at': new_response.created_at.isoformat() if new_response.created_at else None
         }
     }), 201
@@ -121,10 +116,7 @@ def update_response(id):
         response.content = data['content']
     
     if 'triggers' in data:
-        triggers = data['triggers']
-        if isinstance(triggers, list):
-            triggers = ','.join(triggers)
-        response.triggers = triggers
+        response.trigger_list = data['triggers']
     
     # Enregistrer
     db.session.commit()
@@ -132,9 +124,9 @@ def update_response(id):
     # Rafraîchir le cache
     logger.info("===> Tentative de rafraîchissement du cache")
     try:
-        from .fast_responses_cache import refresh_cache
-        refresh_cache()
-        logger.info("===> Cache rafraîchi avec succès")
+        from .fast_responses_cache import schedule_refresh
+        schedule_refresh()
+        logger.info("===> Rafraîchissement du cache planifié")
     except Exception as e:
         logger.error(f"===> Erreur lors du rafraîchissement du cache: {str(e)}", exc_info=True)
     
@@ -145,7 +137,7 @@ def update_response(id):
             'id': response.id,
             'title': response.title,
             'content': response.content,
-            'triggers': response.triggers.split(',') if response.triggers else [],
+            'triggers': response.trigger_list,
             'updated_at': response.updated_at.isoformat() if response.updated_at else None
         }
     })
@@ -164,9 +156,9 @@ def delete_response(id):
     # Rafraîchir le cache
     logger.info("===> Tentative de rafraîchissement du cache")
     try:
-        from .fast_responses_cache import refresh_cache
-        refresh_cache()
-        logger.info("===> Cache rafraîchi avec succès")
+        from .fast_responses_cache import schedule_refresh
+        schedule_refresh()
+        logger.info("===> Rafraîchissement du cache planifié")
     except Exception as e:
         logger.error(f"===> Erreur lors du rafraîchissement du cache: {str(e)}", exc_info=True)
     
@@ -203,7 +195,7 @@ def search_responses():
                 'id': r.id,
                 'title': r.title,
                 'content': r.content,
-                'triggers': r.triggers.split(',') if r.triggers else [],
+                'triggers': r.trigger_list,
                 'created_at': r.created_at.isoformat() if r.created_at else None
             }
             for r in results
@@ -4,6 +4,7 @@ Version refactorée pour fournir des "seeds" au lieu de réponses finales.
 """
 import re
 import logging
+import threading
 import time
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
@@ -19,6 +20,95 @@ cache_initialized = False
 last_refresh = 0
 CACHE_TTL = 300  # 5 minutes
 
+# Tags invalidés en attente de rechargement (rechargés paresseusement)
+_stale_tags = set()
+_events_registered = False
+
+# Découpage en mots (lettres/chiffres), compilé une fois ; la ponctuation n'est plus collée aux mots
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Date/heure formatées, mises en cache à la minute
+_now_cache = {'minute': None, 'date': '', 'time': ''}
+
+# Rafraîchissement en arrière-plan
+_refresh_lock = threading.Lock()
+_refresh_pending = False    # un thread de rafraîchissement est en cours
+_refresh_requested = False  # une demande est arrivée depuis le dernier passage
+
+# Tag propriétaire de chaque clé de settings_cache
+KEY_TAGS = {
+    'bot_name': 'settings',
+    'bot_description': 'settings',
+    'bot_welcome': 'settings',
+    'fallback_message': 'bot_responses',
+    'technical_error': 'bot_responses',
+}
+
+def _load_settings():
+    """Charge les paramètres généraux du bot (tag 'settings')."""
+    from .models import Settings
+    settings = Settings.query.first()
+    if settings:
+        settings_cache['bot_name'] = settings.bot_name or 'Assistant'
+        settings_cache['bot_description'] = settings.bot_description or ''
+        settings_cache['bot_welcome'] = settings.bot_welcome or ''
+
+def _load_bot_responses():
+    """Charge les messages d'erreur et de secours (tag 'bot_responses')."""
+    from .models import BotResponses
+    bot_responses = BotResponses.query.first()
+    if bot_responses:
+        settings_cache['fallback_message'] = bot_responses.fallback_message or "Je ne suis pas sûr de comprendre."
+        settings_cache['technical_error'] = bot_responses.technical_error or "Une erreur technique s'est produite."
+
+def _load_responses():
+    """Charge toutes les réponses rapides indexées par trigger (tag 'responses')."""
+    global responses_cache
+    from .models import DefaultMessage
+    responses = DefaultMessage.query.all()
+    # Construire un nouveau dict puis le substituer d'un coup : les lecteurs
+    # concurrents ne voient jamais un cache vidé ou en cours de remplissage
+    new_cache = {}
+    
+    for response in responses:
+        if response.trigger_list:
+            # Stocker par trigger pour recherche rapide
+            triggers = [t.lower() for t in response.trigger_list]
+            for trigger in triggers:
+                if trigger:
+                    new_cache[trigger] = {
+                        'id': response.id,
+                        'title': response.title,
+                        'content': response.content,
+                        'original_triggers': triggers,
+                        'trigger_words': frozenset(_TOKEN_RE.findall(trigger)),
+                        'created_at': response.created_at
+                    }
+    
+    responses_cache = new_cache
+
+TAG_LOADERS = {
+    'settings': _load_settings,
+    'bot_responses': _load_bot_responses,
+    'responses': _load_responses,
+}
+
+def _register_events():
+    """Abonne le cache aux modifications ORM pour n'invalider que les tags touchés."""
+    global _events_registered
+    if _events_registered:
+        return
+    
+    from .models import Settings, DefaultMessage, BotResponses, on_commit
+    
+    # Marquage après commit (un rechargement entre flush et commit relirait l'ancien état) ;
+    # le rechargement se fait au prochain accès au cache.
+    on_commit(Settings, lambda: invalidate_tag('settings'))
+    on_commit(BotResponses, lambda: invalidate_tag('bot_responses'))
+    on_commit(DefaultMessage, lambda: invalidate_tag('responses'))
+    
+    _events_registered = True
+
 def initialize_cache(app=None):
     """Initialise le cache des réponses rapides."""
     global cache_initialized, last_refresh
@@ -30,39 +120,11 @@ def initialize_cache(app=None):
         return
     
     try:
-        # Charger les paramètres du bot
-        from .models import Settings, DefaultMessage, BotResponses
+        _register_events()
         
-        # Paramètres généraux
-        settings = Settings.query.first()
-        if settings:
-            settings_cache['bot_name'] = settings.bot_name or 'Assistant'
-            settings_cache['bot_description'] = settings.bot_description or ''
-            settings_cache['bot_welcome'] = settings.bot_welcome or ''
-        
-        # Messages d'erreur et fallback
-        bot_responses = BotResponses.query.first()
-        if bot_responses:
-            settings_cache['fallback_message'] = bot_responses.fallback_message or "Je ne suis pas sûr de comprendre."
-            settings_cache['technical_error'] = bot_responses.technical_error or "Une erreur technique s'est produite."
-        
-        # Charger toutes les réponses rapides
-        responses = DefaultMessage.query.all()
-        responses_cache.clear()
-        
-        for response in responses:
-            if response.triggers:
-                # Stocker par trigger pour recherche rapide
-                triggers = [t.strip().lower() for t in response.triggers.split(',')]
-                for trigger in triggers:
-                    if trigger:
-                        responses_cache[trigger] = {
-                            'id': response.id,
-                            'title': response.title,
-                            'content': response.content,
-                            'original_triggers': triggers,
-                            'created_at': response.created_at
-                        }
+        for loader in TAG_LOADERS.values():
+            loader()
+        _stale_tags.clear()
         
         cache_initialized = True
         last_refresh = time.time()
@@ -71,6 +133,33 @@ def initialize_cache(app=None):
     except Exception as e:
         logger.error(f"====> Erreur lors de l'initialisation du cache: {str(e)}", exc_info=True)
 
+def invalidate_tag(tag: str):
+    """Marque un tag comme périmé ; seules ses entrées seront rechargées."""
+    if tag in TAG_LOADERS:
+        _stale_tags.add(tag)
+
+def invalidate_keys(keys: List[str]):
+    """Invalide des clés précises de settings_cache (et donc leur tag)."""
+    for key in keys:
+        settings_cache.pop(key, None)
+        tag = KEY_TAGS.get(key)
+        if tag:
+            _stale_tags.add(tag)
+
+def _ensure_fresh():
+    """Initialise le cache si besoin puis recharge uniquement les tags périmés."""
+    if not cache_initialized:
+        initialize_cache()
+        return
+    
+    for tag in list(_stale_tags):
+        try:
+            TAG_LOADERS[tag]()
+            _stale_tags.discard(tag)
+            logger.info(f"====> Tag de cache '{tag}' rechargé")
+        except Exception as e:
+            logger.error(f"====> Erreur lors du rechargement du tag '{tag}': {str(e)}", exc_info=True)
+
 def get_relevant_responses(message: str, max_results: int = 3) -> List[Dict[str, Any]]:
     """
     Trouve les réponses rapides pertinentes pour enrichir le contexte.
@@ -79,18 +168,19 @@ def get_relevant_responses(message: str, max_results: int = 3) -> List[Dict[str,
     Returns:
         List[Dict]: Liste des réponses pertinentes avec score
     """
-    if not cache_initialized:
-        initialize_cache()
+    _ensure_fresh()
+    # Référence locale : un rafraîchissement concurrent substitue le dict sans le modifier
+    cache = responses_cache
     
     message_lower = message.lower().strip()
     relevant_responses = []
     seen_contents = set()  # Pour éviter les doublons
     
     # 1. Recherche exacte des triggers
-    words = message_lower.split()
+    words = _TOKEN_RE.findall(message_lower)
     for word in words:
-        if word in responses_cache:
-            response = responses_cache[word]
+        if word in cache:
+            response = cache[word]
             content_hash = hash(response['content'])
             if content_hash not in seen_contents:
                 seen_contents.add(content_hash)
@@ -103,7 +193,7 @@ def get_relevant_responses(message: str, max_results: int = 3) -> List[Dict[str,
                 })
     
     # 2. Recherche par sous-chaîne
-    for trigger, response in responses_cache.items():
+    for trigger, response in cache.items():
         if trigger in message_lower and hash(response['content']) not in seen_contents:
             seen_contents.add(hash(response['content']))
             relevant_responses.append({
@@ -115,9 +205,9 @@ def get_relevant_responses(message: str, max_results: int = 3) -> List[Dict[str,
             })
     
     # 3. Recherche par similarité (mots communs)
-    message_words = set(message_lower.split())
-    for trigger, response in responses_cache.items():
-        trigger_words = set(trigger.split())
+    message_words = set(words)
+    for trigger, response in cache.items():
+        trigger_words = response['trigger_words']
         common_words = message_words.intersection(trigger_words)
         
         if len(common_words) > 0 and hash(response['content']) not in seen_contents:
@@ -167,6 +257,16 @@ def get_response_context(message: str) -> Dict[str, Any]:
     
     return context
 
+def current_date_time() -> Tuple[str, str]:
+    """Date et heure formatées, recalculées au plus une fois par minute."""
+    minute = int(time.time()) // 60
+    if _now_cache['minute'] != minute:
+        now = datetime.now()
+        _now_cache['date'] = now.strftime('%d/%m/%Y')
+        _now_cache['time'] = now.strftime('%H:%M')
+        _now_cache['minute'] = minute
+    return _now_cache['date'], _now_cache['time']
+
 def process_variables(content: str, context: Dict[str, Any] = None) -> str:
     """Traite les variables dans le contenu."""
     if not content:
@@ -176,10 +276,12 @@ def process_variables(content: str, context: Dict[str, Any] = None) -> str:
     replacements = {
         '{bot_name}': settings_cache.get('bot_name', 'Assistant'),
         '{domain}': settings_cache.get('bot_description', 'assistance'),
-        '{current_date}': datetime.now().strftime('%d/%m/%Y'),
-        '{current_time}': datetime.now().strftime('%H:%M')
     }
     
+    # La date n'est formatée que si le contenu y fait référence
+    if '{current_date}' in content or '{current_time}' in content:
+        replacements['{current_date}'], replacements['{current_time}'] = current_date_time()
+    
     # Variables additionnelles du contexte
     if context:
         for key, value in context.items():
@@ -199,6 +301,41 @@ def refresh_cache():
     initialize_cache()
     logger.info("====> Cache rafraîchi manuellement")
 
+def schedule_refresh(app=None):
+    """
+    Planifie un rafraîchissement du cache dans un thread d'arrière-plan,
+    pour ne pas bloquer la réponse HTTP des routes d'écriture.
+    Les demandes rapprochées sont regroupées ; un seul thread rafraîchit à la
+    fois et repasse si une demande est arrivée pendant son rafraîchissement.
+    """
+    global _refresh_pending, _refresh_requested
+    
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+    
+    with _refresh_lock:
+        _refresh_requested = True
+        if _refresh_pending:
+            return
+        _refresh_pending = True
+    
+    def _run():
+        global _refresh_pending, _refresh_requested
+        while True:
+            with _refresh_lock:
+                if not _refresh_requested:
+                    _refresh_pending = False
+                    return
+                _refresh_requested = False
+            with app.app_context():
+                try:
+                    refresh_cache()
+                except Exception as e:
+                    logger.error(f"====> Erreur lors du rafraîchissement en arrière-plan: {str(e)}")
+    
+    threading.Thread(target=_run, name="fast-responses-refresh", daemon=True).start()
+
 # Fonctions de compatibilité pour l'ancien code
 def get_fast_response(message: str) -> Optional[Dict[str, Any]]:
     """
@@ -211,14 +348,12 @@ def get_fast_response(message: str) -> Optional[Dict[str, Any]]:
 
 def get_fallback_message() -> str:
     """Retourne le message de secours."""
-    if not cache_initialized:
-        initialize_cache()
+    _ensure_fresh()
     return settings_cache.get('fallback_message', "Je ne suis pas sûr de comprendre. Pouvez-vous reformuler?")
 
 def get_error_message() -> str:
     """Retourne le message d'erreur technique."""
-    if not cache_initialized:
-        initialize_cache()
+    _ensure_fresh()
     return settings_cache.get('technical_error', "Désolé, une erreur technique s'est produite.")
 
 def start_refresh_thread(app=None):
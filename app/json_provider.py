@@ -0,0 +1,35 @@
+"""
+Fournisseur JSON Flask basé sur orjson.
+Remplace le module json de la stdlib pour jsonify() et request.get_json().
+"""
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Sérialisation/désérialisation JSON via orjson (implémentation en Rust)."""
+
+    # Pas de tri des clés par défaut : l'ordre d'insertion suffit aux clients
+    sort_keys = False
+
+    def _options(self, sort_keys, indent):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._options(kwargs.get('sort_keys', self.sort_keys), kwargs.get('indent'))
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """jsonify() : écrit directement les octets orjson, sans passer par une str."""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(self.sort_keys, indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -1,6 +1,8 @@
 from . import db
 from datetime import datetime
+from itertools import chain
 import json
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from . import login_manager
@@ -113,7 +115,14 @@ class Settings(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relation avec User
-    user = db.relationship('User', backref=db.backref('settings', lazy=True))
+    # Chargée par jointure avec l'utilisateur (current_user.settings sans requête supplémentaire)
+    user = db.relationship('User', backref=db.backref('settings', uselist=False, lazy='joined'))
+
+    # Une ligne par utilisateur (la ligne globale a user_id NULL) ; sert aussi de
+    # cible ON CONFLICT pour l'upsert de la configuration API
+    __table_args__ = (
+        db.Index('ix_settings_user_id', 'user_id', unique=True),
+    )
 
     def __repr__(self):
         return f'<Settings {self.bot_name}>'
@@ -290,12 +299,39 @@ class DefaultMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @staticmethod
+    def split_triggers(raw):
+        """Découpe la chaîne de triggers stockée (utilisable sur des lignes non hydratées)"""
+        return [t.strip() for t in raw.split(',') if t.strip()] if raw else []
+
+    @staticmethod
+    def join_triggers(value):
+        """Normalise une liste (ou une chaîne) de triggers en chaîne stockée"""
+        if isinstance(value, str):
+            value = value.split(',')
+        return ','.join(t.strip() for t in (value or []) if t and t.strip())
+
+    @property
+    def trigger_list(self):
+        """Liste des triggers, découpée une seule fois tant que la colonne ne change pas"""
+        cached = self.__dict__.get('_trigger_list_cache')
+        if cached is None or cached[0] != self.triggers:
+            parsed = self.split_triggers(self.triggers)
+            cached = (self.triggers, parsed)
+            self.__dict__['_trigger_list_cache'] = cached
+        return cached[1]
+
+    @trigger_list.setter
+    def trigger_list(self, value):
+        self.triggers = self.join_triggers(value)
+        self.__dict__['_trigger_list_cache'] = (self.triggers, self.split_triggers(self.triggers))
+
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
             'content': self.content,
-            'triggers': self.triggers.split(',') if self.triggers else []
+            'triggers': self.trigger_list
         }
 
 
@@ -415,7 +451,7 @@ class User(UserMixin, db.Model):
     
     def get_api_settings(self):
         """Récupère les paramètres API de l'utilisateur"""
-        return Settings.query.filter_by(user_id=self.id).first()
+        return self.settings
     
     def has_valid_api_key(self):
         """Vérifie si l'utilisateur a au moins une clé API configurée"""
@@ -474,6 +510,12 @@ class APIUsageLog(db.Model):
     # Relation avec User
     user = db.relationship('User', backref=db.backref('api_usage_logs', lazy=True))
 
+    # Index composite (filtre, tri) : historique par utilisateur et purge par date
+    __table_args__ = (
+        db.Index('ix_api_usage_log_user_created', 'user_id', 'created_at'),
+        db.Index('ix_api_usage_log_created', 'created_at'),
+    )
+
 
 class SecurityAuditLog(db.Model):
     """Log d'audit de sécurité"""
@@ -490,6 +532,11 @@ class SecurityAuditLog(db.Model):
     # Relation avec User
     user = db.relationship('User', backref=db.backref('security_logs', lazy=True))
 
+    # Index composite (filtre, tri) utilisé par cleanup_old_logs
+    __table_args__ = (
+        db.Index('ix_security_audit_log_risk_created', 'risk_level', 'created_at'),
+    )
+
 
 ###############################################
 # Chargeur d'utilisateur Flask-Login
@@ -501,10 +548,68 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 
+###############################################
+# Invalidation des caches après commit
+###############################################
+
+# Rappels à exécuter après un commit ayant écrit dans la table d'un modèle
+_commit_callbacks = {}
+
+
+def on_commit(model, callback):
+    """
+    Enregistre callback(), appelé après chaque commit ayant modifié une ligne de model.
+    Les listeners ORM (after_insert, after_update...) partent au flush, avant le commit :
+    un lecteur concurrent remettrait alors en cache les anciennes données.
+    """
+    _commit_callbacks.setdefault(model, []).append(callback)
+
+
+def touch_on_commit(*models):
+    """
+    Signale des écritures invisibles pour le flush (requête Core, bulk_insert_mappings,
+    Query.delete) : les rappels de ces modèles partiront au prochain commit.
+    """
+    db.session.info.setdefault('touched_models', set()).update(models)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_touched_models(session, flush_context):
+    """Note les modèles écrits par le flush (new/dirty/deleted reflètent encore l'état pré-flush)."""
+    touched = session.info.setdefault('touched_models', set())
+    for instance in chain(session.new, session.dirty, session.deleted):
+        touched.add(type(instance))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _run_commit_callbacks(session):
+    """Les données sont désormais visibles par les autres connexions : invalider."""
+    for model in session.info.pop('touched_models', ()):
+        for callback in _commit_callbacks.get(model, ()):
+            callback()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_touched_models(session):
+    """Écritures annulées : les caches restent valides."""
+    session.info.pop('touched_models', None)
+
+
 ###############################################
 # Fonctions utilitaires pour les modèles
 ###############################################
 
+def ensure_log_indexes():
+    """
+    Crée les index des tables de logs absents de la base.
+    db.create_all() ignore les tables existantes : sans cela, les bases déjà
+    déployées n'auraient jamais les index déclarés dans __table_args__.
+    """
+    for model in (APIUsageLog, SecurityAuditLog):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
 def init_default_data():
     """Initialise les données par défaut de l'application"""
     try:
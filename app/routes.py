@@ -3,21 +3,36 @@ import requests
 import os
 import logging
 import json
+import orjson
 import uuid
 import time
 import base64
+import hashlib
+import io
 import asyncio
+import copy
+from collections import OrderedDict
+from itertools import islice
+from functools import lru_cache, partial, wraps
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 from typing import Dict, List, Optional, Any
 from flask import (
     Blueprint, render_template, jsonify, request,
     redirect, url_for, session, current_app, flash,
-    send_from_directory, make_response
+    send_from_directory, send_file, g, has_request_context
 )
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import NotFound
 from dotenv import set_key, load_dotenv
+from requests.adapters import HTTPAdapter
+from sqlalchemy import inspect as sa_inspect
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Importation des modèles et de la base de données
 from .models import (
@@ -25,13 +40,14 @@ from .models import (
     BotCompetences, BotResponses,
     ConversationFlow, FlowNode, NodeConnection, FlowVariable,
     ActionTrigger, EmailTemplate, CalendarConfig,
-    TicketConfig, FormRedirection, DefaultMessage
+    TicketConfig, FormRedirection, DefaultMessage, on_commit, touch_on_commit
 )
 from . import db
 from .config import Config
 
 # Import du context builder
 from .context_builder import ContextBuilder
+from .fast_responses_cache import current_date_time
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -45,17 +61,266 @@ main_bp = Blueprint("main", __name__)
 # Initialiser le context builder comme variable globale pour le blueprint
 context_builder = None
 
-@main_bp.before_app_request
-def initialize_services():
-    """Initialise les services au premier démarrage."""
+
+# Listes d'autorisation (ensembles figés : test d'appartenance par hachage)
+_AVATAR_EXTENSIONS = frozenset({".jpeg", ".jpg", ".png", ".bmp", ".webp", ".avif"})
+_SMS_PROVIDERS = frozenset({"twilio", "vonage"})
+
+# Politique de mot de passe : 8 caractères minimum, une majuscule, une minuscule, un caractère spécial
+_PASSWORD_POLICY_RE = re.compile(r'(?=.*[A-Z])(?=.*[a-z])(?=.*[\W_]).{8,}', re.DOTALL)
+
+# Session HTTP partagée : les connexions TLS vers les APIs sont réutilisées d'un appel à l'autre
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+@lru_cache(maxsize=128)
+def _openai_client(api_key):
+    """Client OpenAI par clé : son pool de connexions interne est réutilisé d'un message à l'autre."""
+    import openai
+    return openai.OpenAI(api_key=api_key)
+
+
+def _api_error_message(response):
+    """Message d'erreur renvoyé par une API HTTP, ou « Erreur HTTP <code> » si le corps n'est pas du JSON."""
+    try:
+        error_data = response.json()
+    except ValueError:
+        error_data = None
+    if isinstance(error_data, dict) and error_data.get('message'):
+        return error_data['message']
+    return f"Erreur HTTP {response.status_code}"
+
+
+@lru_cache(maxsize=1024)
+def _secure_filename(filename):
+    """Version mémoïsée de secure_filename (les mêmes noms de fichiers reviennent souvent)."""
+    return secure_filename(filename)
+
+
+_RESPONSE_DEFAULT_VARIABLES = {
+    'bot_name': 'Assistant',
+    'domain': 'exemple.com',
+    'user_name': 'Visiteur'
+}
+
+_TEST_DEFAULT_VARIABLES = {
+    'bot_name': 'Assistant',
+    'domain': 'example.com'
+}
+
+_VAR_RE = re.compile(r'\{([^{}]+)\}')
+
+# Variables dynamiques, calculées uniquement si le contenu les référence
+_DYNAMIC_VARS = {
+    'current_date': lambda: current_date_time()[0],
+    'current_time': lambda: current_date_time()[1],
+}
+
+
+@lru_cache(maxsize=512)
+def _compile_template(content):
+    """
+    Découpe un modèle une fois pour toutes en [texte, nom, texte, nom, ..., texte].
+    Les réponses rapides reviennent sans cesse : l'analyse n'est faite qu'au premier appel.
+    """
+    return tuple(_VAR_RE.split(content))
+
+
+def _substitute_variables(content, variables):
+    """Remplace les {variables} du contenu à partir du modèle pré-découpé."""
+    parts = _compile_template(content)
+    if len(parts) == 1:
+        return content
+    
+    out = [parts[0]]
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        if name in variables:
+            out.append(str(variables[name]))
+        elif name in _DYNAMIC_VARS:
+            out.append(_DYNAMIC_VARS[name]())
+        else:
+            out.append('{' + name + '}')
+        out.append(parts[i + 1])
+    return ''.join(out)
+
+
+def json_response(payload, status=200):
+    """Réponse JSON sérialisée directement par orjson (datetime pris en charge nativement)."""
+    return current_app.response_class(
+        orjson.dumps(payload), status=status, mimetype='application/json'
+    )
+
+
+def _error_response(exc, status=500):
+    """Réponse d'erreur JSON standard {'error': message}, sérialisée directement."""
+    return json_response({'error': str(exc)}, status)
+
+
+def catch_errors(label, rollback=False):
+    """
+    Décorateur des routes API : journalise l'exception (avec sa trace) sous
+    « label: message », annule la transaction si demandé et renvoie _error_response(e).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except Exception as e:
+                if rollback:
+                    db.session.rollback()
+                # Formatage différé et trace complète, capturée par le module logging
+                logger.exception("%s: %s", label, e)
+                return _error_response(e)
+        return wrapper
+    return decorator
+
+
+def _react_main_js():
+    """
+    Chemin du bundle React principal, lu dans asset-manifest.json au premier appel
+    puis conservé dans la config (le manifest ne change qu'au déploiement).
+    En cas d'échec rien n'est mémorisé : un build ajouté plus tard est pris en compte.
+    """
+    main_js = current_app.config.get('REACT_MAIN_JS')
+    if main_js:
+        return main_js
+    
+    manifest_path = os.path.join(current_app.root_path, 'static', 'react', 'asset-manifest.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        main_js = 'react/static/js/' + os.path.basename(manifest['files']['main.js'])
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture du manifest: {e}")
+        return None
+    
+    current_app.config['REACT_MAIN_JS'] = main_js
+    return main_js
+
+
+@lru_cache(maxsize=8)
+def _no_api_config_body(config_url):
+    """
+    Corps JSON renvoyé par /api/message quand aucune clé API n'est configurée.
+    Mis en cache par URL : celle-ci dépend du préfixe de montage de la requête.
+    """
+    return orjson.dumps({
+        "message": "Aucune clé API configurée. Veuillez configurer vos clés dans les paramètres.",
+        "error": True,
+        "config_required": True,
+        "config_url": config_url
+    })
+
+
+def _read_import_file(file):
+    """
+    Lit un fichier d'import JSON sans dépasser MAX_IMPORT_SIZE (+1 octet pour détecter
+    le dépassement) : un upload chunké n'a pas de Content-Length et échappe au pré-test.
+    Renvoie None si le fichier est trop volumineux.
+    """
+    limit = current_app.config.get('MAX_IMPORT_SIZE', Config.MAX_IMPORT_SIZE)
+    data = file.stream.read(limit + 1)
+    if len(data) > limit:
+        return None
+    return data
+
+
+def _form_strs(*keys):
+    """Récupère plusieurs champs de formulaire nettoyés en une seule passe."""
+    form = request.form
+    return {key: form.get(key, "").strip() for key in keys}
+
+
+# Cache en mémoire de la liste des réponses rapides (corps JSON pré-sérialisé)
+_fast_responses_cache = {'data': None, 'mtime': 0}
+FAST_RESPONSES_CACHE_TTL = 60  # secondes
+
+
+def _invalidate_fast_responses_cache():
+    """Force la reconstruction de la liste des réponses rapides au prochain GET."""
+    _fast_responses_cache['mtime'] = 0
+
+
+# Cache en mémoire du corps JSON de /api/configuration : (octets, etag)
+_config_body_cache = {'data': None, 'mtime': 0}
+CONFIG_BODY_CACHE_TTL = 60  # secondes (les écritures des autres workers ne sont pas vues)
+
+
+def _invalidate_config_body():
+    """Force la reconstruction de la configuration des réponses au prochain GET."""
+    _config_body_cache['mtime'] = 0
+
+
+# Cache en mémoire des tables singleton (Settings, BotResponses)
+_singleton_cache = {}
+SINGLETON_CACHE_TTL = 60  # secondes
+
+
+def _get_cached_singleton(model):
+    """
+    Renvoie un instantané en lecture seule (colonnes uniquement) de model.query.first().
+    Ne pas l'utiliser pour écrire : les routes de sauvegarde gardent leur propre requête.
+    Les valeurs sont copiées en profondeur : une modification en place de l'instance
+    ORM (même annulée ensuite) ne doit pas transparaître dans l'instantané partagé.
+    """
+    entry = _singleton_cache.get(model.__name__)
+    if entry and time.time() - entry['mtime'] < SINGLETON_CACHE_TTL:
+        return entry['data']
+    
+    instance = model.query.first()
+    snapshot = None
+    if instance is not None:
+        values = {}
+        for column in sa_inspect(model).column_attrs:
+            values[column.key] = copy.deepcopy(getattr(instance, column.key))
+            # Colonne JSON privée (_vocabulary...) : exposer aussi la valeur décodée
+            # par la propriété publique, comme sur l'instance ORM
+            public_name = column.key.lstrip('_')
+            if public_name != column.key and isinstance(getattr(model, public_name, None), property):
+                values[public_name] = copy.deepcopy(getattr(instance, public_name))
+        snapshot = SimpleNamespace(**values)
+    _singleton_cache[model.__name__] = {'data': snapshot, 'mtime': time.time()}
+    return snapshot
+
+
+def get_settings_cached():
+    """Paramètres généraux du bot, mémoïsés."""
+    return _get_cached_singleton(Settings)
+
+
+def get_bot_responses_cached():
+    """Configuration des réponses du bot, mémoïsée."""
+    return _get_cached_singleton(BotResponses)
+
+
+def _invalidate_singleton_cache(model):
+    _singleton_cache.pop(model.__name__, None)
+
+
+# Toute écriture sur ces tables invalide l'instantané correspondant, une fois commitée
+for _model in (Settings, BotResponses):
+    on_commit(_model, partial(_invalidate_singleton_cache, _model))
+
+# La configuration des réponses agrège ces trois tables : invalidation après commit,
+# sinon un GET entre flush et commit remettrait en cache (avec un ETag neuf) l'ancien corps
+for _model in (Settings, BotResponses, DefaultMessage):
+    on_commit(_model, _invalidate_config_body)
+
+
+@main_bp.record_once
+def initialize_services(state):
+    """Initialise les services une seule fois, à l'enregistrement du blueprint."""
     global context_builder
-    context_builder = ContextBuilder(current_app)
+    context_builder = ContextBuilder(state.app)
     logger.info("Services initialisés: ContextBuilder prêt")
 
 @main_bp.context_processor
 def inject_settings():
     """Injecte les paramètres globaux dans tous les templates."""
-    settings = Settings.query.first()
+    settings = get_settings_cached()
     return dict(settings=settings)
 
 
@@ -66,16 +331,7 @@ def home():
     use_mistral = True  # Interface peut configurer Mistral
     use_openai = True   # Interface peut configurer OpenAI
     
-    # Lecture du manifest pour récupérer le fichier JS correct
-    manifest_path = os.path.join(current_app.root_path, 'static', 'react', 'asset-manifest.json')
-    main_js = None
-    try:
-        with open(manifest_path) as f:
-            manifest = json.load(f)
-            main_js = 'react/static/js/' + os.path.basename(manifest['files']['main.js'])
-    except Exception as e:
-        logger.error(f"Erreur lors de la lecture du manifest: {e}")
-        main_js = None
+    main_js = _react_main_js()
 
     return render_template(
         "index.html", 
@@ -103,7 +359,7 @@ def login():
     if request.method == "POST":
         username = request.form.get("username")
         password = request.form.get("password")
-        logger.debug(f"Tentative de connexion pour l'utilisateur: {username}")
+        logger.debug("Tentative de connexion pour l'utilisateur: %s", username)
 
         # Vérification reCAPTCHA si configuré
         recaptcha_response = request.form.get("g-recaptcha-response")
@@ -112,7 +368,7 @@ def login():
             verify_url = "https://www.google.com/recaptcha/api/siteverify"
             payload = {"secret": secret, "response": recaptcha_response}
             try:
-                r = requests.post(verify_url, data=payload, timeout=10).json()
+                r = _http.post(verify_url, data=payload, timeout=10).json()
                 
                 if not r.get("success"):
                     logger.warning("Échec de la vérification reCAPTCHA")
@@ -123,14 +379,14 @@ def login():
                         recaptcha_sitekey=current_app.config.get("RECAPTCHA_SITE_KEY", "")
                     )
             except Exception as e:
-                logger.warning(f"Erreur reCAPTCHA: {e}")
+                logger.warning("Erreur reCAPTCHA: %s", e)
 
         # Vérification des identifiants
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
             login_user(user, remember=True)
-            logger.info(f"Connexion réussie pour: {username}")
+            logger.info("Connexion réussie pour: %s", username)
             
             next_page = session.get('next')
             if next_page:
@@ -139,7 +395,7 @@ def login():
             
             return redirect(url_for("main.home"))
         else:
-            logger.warning(f"Échec de connexion pour: {username}")
+            logger.warning("Échec de connexion pour: %s", username)
             error = "Identifiant ou mot de passe incorrect."
 
     return render_template(
@@ -162,10 +418,9 @@ def forgot_password():
     message = None
     if request.method == "POST":
         admin_email = current_app.config.get("ADMIN_LOGIN", "admin@example.com")
-        new_password = request.form.get("new_password")
+        new_password = request.form.get("new_password", "")
         
-        if (len(new_password) < 8 or not re.search(r"[A-Z]", new_password) or 
-            not re.search(r"[a-z]", new_password) or not re.search(r"[\W_]", new_password)):
+        if not _PASSWORD_POLICY_RE.fullmatch(new_password):
             message = ("Le mot de passe doit contenir au moins 8 caractères, "
                       "une majuscule, une minuscule et un caractère spécial.")
         else:
@@ -180,9 +435,20 @@ def check_key():
     # Vérifier si l'utilisateur a des clés configurées
     has_user_config = False
     if current_user.is_authenticated:
-        user_settings = Settings.query.filter_by(user_id=current_user.id).first()
+        user_settings = current_user.settings
         has_user_config = bool(user_settings and (user_settings.encrypted_openai_key or user_settings.encrypted_mistral_key))
     
+    # La réponse ne dépend que de ces trois indicateurs : ETag calculé avant de la construire
+    context_builder_ready = context_builder is not None
+    encryption_ready = bool(current_app.config.get('ENCRYPTION_KEY'))
+    etag = hashlib.sha1(
+        f"{current_user.get_id()}:{has_user_config}:{context_builder_ready}:{encryption_ready}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
     api_status = {
         "local_model": {
             "active": False,  # Pas de modèle local
@@ -210,13 +476,17 @@ def check_key():
     # Informations sur le backend
     api_status["backend_info"] = {
         "database_ready": True,
-        "context_builder_ready": context_builder is not None,
+        "context_builder_ready": context_builder_ready,
         "session_management": True,
         "cache_available": True,
-        "encryption_ready": bool(current_app.config.get('ENCRYPTION_KEY'))
+        "encryption_ready": encryption_ready
     }
     
-    return jsonify(api_status)
+    response = json_response(api_status)
+    response.set_etag(etag)
+    # Toujours revalider : l'état change dès que l'utilisateur enregistre une clé
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @main_bp.route("/api/health", methods=["GET"])
@@ -243,19 +513,19 @@ def health_check():
             status == "ok" for status in services_status.values()
         ) else "degraded"
         
-        return jsonify({
+        return json_response({
             "status": overall_status,
             "mode": "user_keys_api",
             "services": services_status,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
         
     except Exception as e:
-        return jsonify({
+        return json_response({
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        }), 500
+            "timestamp": datetime.utcnow()
+        }, 500)
 
 
 ############################################################################
@@ -285,6 +555,97 @@ def get_encryption_key():
     return encryption_key
 
 
+def get_cipher():
+    """Renvoie le chiffreur Fernet de l'application, construit une seule fois par clé."""
+    encryption_key = get_encryption_key()
+    cached = current_app.extensions.get('cipher')
+    if cached is None or cached[0] != encryption_key:
+        from cryptography.fernet import Fernet
+        cached = (encryption_key, Fernet(encryption_key))
+        current_app.extensions['cipher'] = cached
+    return cached[1]
+
+
+# Un jeton Fernet commence par l'octet de version 0x80 suivi d'un horodatage,
+# soit « gAAAAA » en base64 url-safe
+_FERNET_TOKEN_PREFIX = 'gAAAAA'
+
+
+def _encrypt_api_key(api_key):
+    """Chiffre une clé API ; le jeton Fernet (ASCII) est stocké tel quel."""
+    return get_cipher().encrypt(api_key.encode()).decode('ascii')
+
+
+def _decrypt_api_key(stored):
+    """
+    Déchiffre une clé API stockée. Les anciennes lignes contiennent le jeton
+    ré-encodé en base64 : elles restent lisibles sans migration.
+    """
+    if stored.startswith(_FERNET_TOKEN_PREFIX):
+        token = stored.encode('ascii')
+    else:
+        token = base64.b64decode(stored)
+    return get_cipher().decrypt(token).decode()
+
+
+# Présence de l'index unique settings.user_id, vérifiée une fois par moteur
+_settings_unique_index = {}
+
+
+def _has_settings_unique_index(bind):
+    """
+    Vérifie que l'index unique ix_settings_user_id existe réellement.
+    db.create_all() ne l'ajoute pas aux tables existantes : sans la migration
+    5b7e1f0c9a42, ON CONFLICT (user_id) échouerait.
+    """
+    key = str(bind.engine.url)
+    if key not in _settings_unique_index:
+        indexes = sa_inspect(bind).get_indexes('settings')
+        _settings_unique_index[key] = any(
+            index['name'] == 'ix_settings_user_id' and index['unique'] for index in indexes
+        )
+        if not _settings_unique_index[key]:
+            logger.warning("Index ix_settings_user_id absent : upsert Settings via l'ORM (appliquer les migrations)")
+    return _settings_unique_index[key]
+
+
+def _upsert_user_settings(user_id, values):
+    """
+    Crée ou met à jour la ligne Settings d'un utilisateur en une seule requête
+    (INSERT ... ON CONFLICT (user_id) DO UPDATE) sur SQLite et PostgreSQL.
+    Repli sur lecture + écriture ORM pour les autres moteurs, ou si l'index
+    unique sur user_id n'existe pas encore dans la base.
+    """
+    bind = db.session.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+    
+    if dialect_insert is not None and not _has_settings_unique_index(bind):
+        dialect_insert = None
+    
+    if dialect_insert is None:
+        user_settings = Settings.query.filter_by(user_id=user_id).first()
+        if not user_settings:
+            user_settings = Settings(user_id=user_id)
+            db.session.add(user_settings)
+        for key, value in values.items():
+            setattr(user_settings, key, value)
+        return
+    
+    stmt = dialect_insert(Settings).values(user_id=user_id, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_=values)
+    db.session.execute(stmt)
+    
+    # Requête Core, invisible pour le flush : signaler Settings pour que les caches
+    # soient invalidés au commit de l'appelant (pas avant, sinon ils seraient re-remplis)
+    touch_on_commit(Settings)
+
+
 @main_bp.route("/api/save-api-config", methods=["POST"])
 @login_required
 def save_api_config():
@@ -294,41 +655,30 @@ def save_api_config():
         if not data:
             return jsonify({"success": False, "error": "Données manquantes"}), 400
         
-        # Chiffrement des clés
-        from cryptography.fernet import Fernet
-        
-        encryption_key = get_encryption_key()
-        cipher_suite = Fernet(encryption_key)
-        
-        # Récupérer ou créer les settings utilisateur
-        user_settings = Settings.query.filter_by(user_id=current_user.id).first()
-        if not user_settings:
-            user_settings = Settings(user_id=current_user.id)
-            db.session.add(user_settings)
-        
         # Sauvegarder selon le provider
         provider = data.get('provider')
+        values = {}
         
         if provider == 'openai' and data.get('openai_key'):
             # Chiffrer la clé OpenAI
-            encrypted_key = cipher_suite.encrypt(data['openai_key'].encode())
-            user_settings.encrypted_openai_key = base64.b64encode(encrypted_key).decode()
-            user_settings.openai_model = data.get('openai_model', 'gpt-3.5-turbo')
-            logger.info(f"Clé OpenAI configurée pour {current_user.username}")
+            values['encrypted_openai_key'] = _encrypt_api_key(data['openai_key'])
+            values['openai_model'] = data.get('openai_model', 'gpt-3.5-turbo')
+            logger.info("Clé OpenAI configurée pour %s", current_user.username)
             
         elif provider == 'mistral' and data.get('mistral_key'):
             # Chiffrer la clé Mistral
-            encrypted_key = cipher_suite.encrypt(data['mistral_key'].encode())
-            user_settings.encrypted_mistral_key = base64.b64encode(encrypted_key).decode()
-            user_settings.mistral_model = data.get('mistral_model', 'mistral-small')
-            logger.info(f"Clé Mistral configurée pour {current_user.username}")
+            values['encrypted_mistral_key'] = _encrypt_api_key(data['mistral_key'])
+            values['mistral_model'] = data.get('mistral_model', 'mistral-small')
+            logger.info("Clé Mistral configurée pour %s", current_user.username)
         
-        user_settings.current_provider = provider
-        user_settings.updated_at = datetime.utcnow()
+        values['current_provider'] = provider
+        values['updated_at'] = datetime.utcnow()
         
+        # Créer ou mettre à jour les settings utilisateur
+        _upsert_user_settings(current_user.id, values)
         db.session.commit()
         
-        logger.info(f"Configuration API sauvegardée pour {current_user.username} - Provider: {provider}")
+        logger.info("Configuration API sauvegardée pour %s - Provider: %s", current_user.username, provider)
         
         return jsonify({
             "success": True,
@@ -337,7 +687,7 @@ def save_api_config():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Erreur sauvegarde API config: {str(e)}")
+        logger.exception("Erreur sauvegarde API config: %s", e)
         return jsonify({
             "success": False,
             "error": f"Erreur de sauvegarde: {str(e)}"
@@ -349,56 +699,44 @@ def save_api_config():
 def get_api_config():
     """Récupère la configuration API de l'utilisateur."""
     try:
-        user_settings = Settings.query.filter_by(user_id=current_user.id).first()
+        user_settings = current_user.settings
         
         if not user_settings:
-            return jsonify({
+            return json_response({
                 "success": True,
                 "data": None,
                 "message": "Aucune configuration trouvée"
             })
         
-        # Déchiffrement des clés
-        from cryptography.fernet import Fernet
-        
-        encryption_key = get_encryption_key()
-        cipher_suite = Fernet(encryption_key)
-        
         config_data = {
             "provider": user_settings.current_provider
         }
         
-        # Déchiffrer OpenAI si présent
-        if user_settings.encrypted_openai_key:
-            try:
-                encrypted_key = base64.b64decode(user_settings.encrypted_openai_key)
-                decrypted_key = cipher_suite.decrypt(encrypted_key).decode()
-                config_data["openai_key"] = decrypted_key
-                config_data["openai_model"] = user_settings.openai_model or 'gpt-3.5-turbo'
-            except Exception as e:
-                logger.error(f"Erreur déchiffrement OpenAI pour {current_user.username}: {e}")
-        
-        # Déchiffrer Mistral si présent  
-        if user_settings.encrypted_mistral_key:
+        # Déchiffrer chaque clé présente
+        providers = (
+            ('openai', 'OpenAI', user_settings.encrypted_openai_key, user_settings.openai_model, 'gpt-3.5-turbo'),
+            ('mistral', 'Mistral', user_settings.encrypted_mistral_key, user_settings.mistral_model, 'mistral-small'),
+        )
+        for name, label, encrypted_key, model, default_model in providers:
+            if not encrypted_key:
+                continue
             try:
-                encrypted_key = base64.b64decode(user_settings.encrypted_mistral_key)
-                decrypted_key = cipher_suite.decrypt(encrypted_key).decode()
-                config_data["mistral_key"] = decrypted_key
-                config_data["mistral_model"] = user_settings.mistral_model or 'mistral-small'
+                config_data[f"{name}_key"] = _decrypt_api_key(encrypted_key)
+                config_data[f"{name}_model"] = model or default_model
             except Exception as e:
-                logger.error(f"Erreur déchiffrement Mistral pour {current_user.username}: {e}")
+                logger.error("Erreur déchiffrement %s pour %s: %s", label, current_user.username, e)
         
-        return jsonify({
+        return json_response({
             "success": True,
             "data": config_data
         })
         
     except Exception as e:
         logger.error(f"Erreur récupération config pour {current_user.username}: {str(e)}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": f"Erreur de récupération: {str(e)}"
-        }), 500
+        }, 500)
 
 
 @main_bp.route("/api/test-api-key", methods=["POST"])
@@ -428,12 +766,12 @@ def test_api_key():
                 "error": "Provider non supporté"
             }), 400
         
-        logger.info(f"Test API {provider} pour {current_user.username}: {'Succès' if result['success'] else 'Échec'}")
+        logger.info("Test API %s pour %s: %s", provider, current_user.username, 'Succès' if result['success'] else 'Échec')
         
         return jsonify(result)
         
     except Exception as e:
-        logger.error(f"Erreur test API: {str(e)}")
+        logger.exception("Erreur test API: %s", e)
         return jsonify({
             "success": False,
             "error": f"Erreur de test: {str(e)}"
@@ -490,7 +828,7 @@ def test_mistral_key(api_key, model):
             'max_tokens': 5
         }
         
-        response = requests.post(
+        response = _http.post(
             'https://api.mistral.ai/v1/chat/completions',
             headers=headers,
             json=payload,
@@ -503,11 +841,10 @@ def test_mistral_key(api_key, model):
                 "success": True,
                 "message": f"Clé Mistral valide - Modèle {model} opérationnel",
                 "model": model,
-                "usage": data.get('usage', {}).get('total_tokens') if 'usage' in data else None
+                "usage": (data.get('usage') or {}).get('total_tokens')
             }
         else:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-            error_msg = error_data.get('message', f"Erreur HTTP {response.status_code}")
+            error_msg = _api_error_message(response)
             
             if response.status_code == 401:
                 error_msg = "Clé API invalide ou expirée"
@@ -572,12 +909,7 @@ def chatbot():
         # Récupérer la configuration API de l'utilisateur
         user_config = get_user_api_config()
         if not user_config:
-            return jsonify({
-                "message": "Aucune clé API configurée. Veuillez configurer vos clés dans les paramètres.",
-                "error": True,
-                "config_required": True,
-                "config_url": url_for('main.config_api')
-            }), 400
+            return current_app.response_class(_no_api_config_body(url_for('main.config_api')), status=400, mimetype='application/json')
         
         # Initialiser le context builder si nécessaire
         global context_builder
@@ -585,7 +917,7 @@ def chatbot():
             context_builder = ContextBuilder(current_app)
         
         # Construction du contexte enrichi
-        logger.info(f"Construction du contexte pour {current_user.username}: {user_message[:50]}...")
+        logger.info("Construction du contexte pour %s: %.50s...", current_user.username, user_message)
         
         conversation_history = session.get('conversation_history', [])
         
@@ -598,7 +930,7 @@ def chatbot():
             }
         )
         
-        logger.info(f"Métadonnées du prompt: {prompt_metadata}")
+        logger.info("Métadonnées du prompt: %s", prompt_metadata)
         
         # Configuration adaptative basée sur les métadonnées
         complexity = prompt_metadata.get('complexity', 1)
@@ -622,11 +954,12 @@ def chatbot():
             }), 500
         
         # Sauvegarder dans l'historique de conversation
-        if 'conversation_history' not in session:
-            session['conversation_history'] = []
+        history = session.get('conversation_history')
+        if history is None:
+            history = session['conversation_history'] = []
             session['session_id'] = str(uuid.uuid4())
         
-        session['conversation_history'].append({
+        history.append({
             'timestamp': int(time.time()),
             'message': user_message,
             'response': api_response['message'][:200] + "..." if len(api_response['message']) > 200 else api_response['message'],
@@ -637,17 +970,17 @@ def chatbot():
             'identity_corrected': api_response.get('identity_corrected', False)  # ← NOUVEAU
         })
         
-        # Limiter l'historique à 20 messages
-        if len(session['conversation_history']) > 20:
-            session['conversation_history'] = session['conversation_history'][-20:]
+        # Limiter l'historique à 20 messages (troncature en place, sans copie de la liste)
+        del history[:-20]
         
+        # Liste modifiée en place : signaler explicitement la session comme modifiée
         session.modified = True
         
         processing_time = time.time() - start_time
         
-        logger.info(f"Message traité pour {current_user.username} en {processing_time:.2f}s")
+        logger.info("Message traité pour %s en %.2fs", current_user.username, processing_time)
         if api_response.get('identity_corrected'):
-            logger.info(f"🔧 Identité corrigée pour {current_user.username}")
+            logger.info("🔧 Identité corrigée pour %s", current_user.username)
         
         # Retourner la réponse
         return jsonify({
@@ -666,7 +999,10 @@ def chatbot():
         })
             
     except Exception as e:
-        logger.error(f"Erreur générale dans /api/message pour {current_user.username if current_user.is_authenticated else 'anonyme'}: {str(e)}", exc_info=True)
+        logger.exception(
+            "Erreur générale dans /api/message pour %s: %s",
+            current_user.username if current_user.is_authenticated else 'anonyme', e
+        )
         return jsonify({
             "message": "Une erreur inattendue s'est produite. Veuillez réessayer.",
             "error": True,
@@ -680,15 +1016,10 @@ def get_user_api_config():
         if not current_user.is_authenticated:
             return None
             
-        user_settings = Settings.query.filter_by(user_id=current_user.id).first()
+        user_settings = current_user.settings
         if not user_settings or not user_settings.current_provider:
             return None
         
-        from cryptography.fernet import Fernet
-        
-        encryption_key = get_encryption_key()
-        cipher_suite = Fernet(encryption_key)
-        
         config = {
             'provider': user_settings.current_provider
         }
@@ -696,8 +1027,7 @@ def get_user_api_config():
         # Déchiffrer selon le provider
         if user_settings.current_provider == 'openai' and user_settings.encrypted_openai_key:
             try:
-                encrypted_key = base64.b64decode(user_settings.encrypted_openai_key)
-                api_key = cipher_suite.decrypt(encrypted_key).decode()
+                api_key = _decrypt_api_key(user_settings.encrypted_openai_key)
                 config.update({
                     'api_key': api_key,
                     'model': user_settings.openai_model or 'gpt-3.5-turbo'
@@ -708,8 +1038,7 @@ def get_user_api_config():
                 
         elif user_settings.current_provider == 'mistral' and user_settings.encrypted_mistral_key:
             try:
-                encrypted_key = base64.b64decode(user_settings.encrypted_mistral_key)
-                api_key = cipher_suite.decrypt(encrypted_key).decode()
+                api_key = _decrypt_api_key(user_settings.encrypted_mistral_key)
                 config.update({
                     'api_key': api_key,
                     'model': user_settings.mistral_model or 'mistral-small'
@@ -759,56 +1088,76 @@ def make_api_call_with_user_keys(prompt, user_config, complexity, bot_info=None)
             original_message = response['message']
             corrected_message = post_process_api_response(original_message, bot_info)
             
-            if original_message != corrected_message:
+            # post_process_api_response renvoie le même objet quand rien n'a été corrigé
+            if corrected_message is not original_message:
                 logger.info("🔧 Identité forcée dans la réponse API")
                 response['message'] = corrected_message
-response['identity_corrected'] = True
-           else:
-               response['identity_corrected'] = False
-       
-       return response
-           
-   except Exception as e:
-       logger.error(f"Erreur appel API: {e}")
-       return {'error': str(e)}
+                response['identity_corrected'] = True
+            else:
+                response['identity_corrected'] = False
+        
+        return response
+            
+    except Exception as e:
+        logger.error(f"Erreur appel API: {e}")
+        return {'error': str(e)}
+
+
+# Formulations d'identité à remplacer : (motif, gabarit de remplacement)
+_IDENTITY_PATTERNS = (
+   (r'je suis une assistante virtuelle[^.!?]*[.!?]?', "Je suis {name}. {description}"),
+   (r'je suis un assistant virtuel[^.!?]*[.!?]?', "Je suis {name}. {description}"),
+   (r'je suis une ia[^.!?]*[.!?]?', "Je suis {name}"),
+   (r'je suis claude[^.!?]*[.!?]?', "Je suis {name}"),
+   (r'je suis chatgpt[^.!?]*[.!?]?', "Je suis {name}"),
+   (r'assistante virtuelle spécialisée', "{name}"),
+   (r'assistant virtuel spécialisé', "{name}"),
+   (r'en tant qu\'assistante virtuelle', "en tant que {name}"),
+   (r'en tant qu\'assistant virtuel', "en tant que {name}"),
+)
+
+# Chaque motif contient l'une de ces sous-chaînes : si aucune n'apparaît, rien à corriger.
+# casefold() ne reproduit pas re.IGNORECASE pour 'İ' (U+0130 -> "i\u0307") et 'ı' (U+0131),
+# que re.I fait correspondre à 'i' : leur présence impose de passer par la regex.
+_IDENTITY_SNIFF = ("je suis", "assistant", "i\u0307", "\u0131")
+
+# Tous les motifs réunis en une alternative à groupes nommés (p0, p1, ...) :
+# un seul parcours du texte, le groupe trouvé désigne le gabarit à appliquer
+_IDENTITY_RE = re.compile(
+   '|'.join(f'(?P<p{i}>{pattern})' for i, (pattern, _) in enumerate(_IDENTITY_PATTERNS)),
+   re.IGNORECASE
+)
 
 
 def post_process_api_response(response_text: str, bot_info: Dict[str, str]) -> str:
    """
    Post-traite une réponse d'API pour forcer l'identité correcte.
+   Renvoie response_text lui-même (même objet) si rien n'a été corrigé.
    """
-   import re
+   # Pré-test en C sur le texte normalisé : la plupart des réponses n'ont rien à corriger
+   # (les i turcs, voir _IDENTITY_SNIFF, renvoient toujours vers la regex)
+   folded = response_text.casefold()
+   if not any(sniff in folded for sniff in _IDENTITY_SNIFF):
+       return response_text
    
-   # Phrases à remplacer (patterns plus larges)
+   fields = {'name': bot_info['name'], 'description': bot_info.get('description', '')}
    replacements = {
-       r'je suis une assistante virtuelle[^.!?]*[.!?]?': f"Je suis {bot_info['name']}. {bot_info['description']}",
-       r'je suis un assistant virtuel[^.!?]*[.!?]?': f"Je suis {bot_info['name']}. {bot_info['description']}",
-       r'je suis une ia[^.!?]*[.!?]?': f"Je suis {bot_info['name']}",
-       r'je suis claude[^.!?]*[.!?]?': f"Je suis {bot_info['name']}",
-       r'je suis chatgpt[^.!?]*[.!?]?': f"Je suis {bot_info['name']}",
-       r'assistante virtuelle spécialisée': bot_info['name'],
-       r'assistant virtuel spécialisé': bot_info['name'],
-       r'en tant qu\'assistante virtuelle': f"en tant que {bot_info['name']}",
-       r'en tant qu\'assistant virtuel': f"en tant que {bot_info['name']}"
+       f'p{i}': template.format(**fields)
+       for i, (_, template) in enumerate(_IDENTITY_PATTERNS)
    }
    
-   corrected_text = response_text
-   
-   for pattern, replacement in replacements.items():
-       new_text = re.sub(pattern, replacement, corrected_text, flags=re.IGNORECASE)
-       if new_text != corrected_text:
-           logger.debug(f"Pattern remplacé: {pattern[:30]}...")
-           corrected_text = new_text
+   corrected_text, count = _IDENTITY_RE.subn(lambda m: replacements[m.lastgroup], response_text)
+   if not count:
+       return response_text
    
+   logger.debug("Identité: %d formulation(s) remplacée(s)", count)
    return corrected_text
 
 
 def call_openai_api(api_key, model, prompt, max_tokens, temperature):
    """Appel à l'API OpenAI."""
    try:
-       import openai
-       
-       client = openai.OpenAI(api_key=api_key)
+       client = _openai_client(api_key)
        
        response = client.chat.completions.create(
            model=model,
@@ -847,7 +1196,7 @@ def call_mistral_api(api_key, model, prompt, max_tokens, temperature):
            'temperature': temperature
        }
        
-       response = requests.post(
+       response = _http.post(
            'https://api.mistral.ai/v1/chat/completions',
            headers=headers,
            json=payload,
@@ -861,9 +1210,7 @@ def call_mistral_api(api_key, model, prompt, max_tokens, temperature):
                'usage': data.get('usage', {})
            }
        else:
-           error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
-           error_msg = error_data.get('message', f"Erreur HTTP {response.status_code}")
-           return {'error': f'Erreur Mistral: {error_msg}'}
+           return {'error': f'Erreur Mistral: {_api_error_message(response)}'}
            
    except Exception as e:
        logger.error(f"Erreur Mistral API: {e}")
@@ -941,372 +1288,361 @@ def responses_wizard():
        current_section=section
    )
 
-@responses_bp.route('/api/configuration', methods=['GET'])
-@login_required
-def get_responses_configuration():
-   """Récupère toute la configuration des réponses."""
-   try:
-       config = BotResponses.query.first()
-       settings = Settings.query.first()
-       default_messages = DefaultMessage.query.all()
+
+def _build_config_dict():
+   """Construit la configuration complète des réponses sous forme de dict."""
+   config = BotResponses.query.first()
+   settings = Settings.query.first()
+   default_messages = DefaultMessage.query.all()
+   
+   # Construction de la configuration complète
+   configuration = {
+       # Message de bienvenue
+       'welcomeMessage': settings.bot_welcome if settings else '',
+       
+       # Templates essentiels (simulés - à implémenter selon vos besoins)
+       'essentialTemplates': {
+           'greeting': {
+               'active': True,
+               'style': 'formal',
+               'customMessage': ''
+           },
+           'goodbye': {
+               'active': True,
+               'style': 'polite',
+               'customMessage': ''
+           },
+           'thanks': {
+               'active': True,
+               'style': 'simple',
+               'customMessage': ''
+           },
+           'unclear': {
+               'active': True,
+               'style': 'helpful',
+               'customMessage': ''
+           }
+       },
        
-       # Construction de la configuration complète
-       configuration = {
-           # Message de bienvenue
-           'welcomeMessage': settings.bot_welcome if settings else '',
-           
-           # Templates essentiels (simulés - à implémenter selon vos besoins)
-           'essentialTemplates': {
-               'greeting': {
-                   'active': True,
-                   'style': 'formal',
-                   'customMessage': ''
-               },
-               'goodbye': {
-                   'active': True,
-                   'style': 'polite',
-                   'customMessage': ''
-               },
-               'thanks': {
-                   'active': True,
-                   'style': 'simple',
-                   'customMessage': ''
-               },
-               'unclear': {
-                   'active': True,
-                   'style': 'helpful',
-                   'customMessage': ''
-               }
+       # Réponses personnalisées (depuis DefaultMessage)
+       'customResponses': [
+           {
+               'id': msg.id,
+               'keywords': msg.trigger_list,
+               'content': msg.content,
+               'created': msg.created_at
+           }
+           for msg in default_messages
+       ],
+       
+       # Vocabulaire métier
+       'vocabulary': [
+           {
+               'id': idx + 1,
+               'term': term,
+               'definition': definition
+           }
+           for idx, (term, definition) in enumerate(config.vocabulary.items())
+       ] if config and config.vocabulary else [],
+       
+       # Messages d'erreur (simulés)
+       'errorMessages': [
+           {
+               'title': 'Dépassement du temps de réponse',
+               'code': 'TIMEOUT',
+               'content': 'Je prends un peu plus de temps que prévu pour traiter votre demande. Pouvez-vous patienter quelques instants ou reformuler votre question ?'
            },
-           
-           # Réponses personnalisées (depuis DefaultMessage)
-           'customResponses': [
-               {
-                   'id': msg.id,
-                   'keywords': msg.triggers.split(',') if msg.triggers else [],
-                   'content': msg.content,
-                   'created': msg.created_at.isoformat() if msg.created_at else None
-               }
-               for msg in default_messages
-           ],
-           
-           # Vocabulaire métier
-           'vocabulary': [
-               {
-                   'id': idx + 1,
-                   'term': term,
-                   'definition': definition
-               }
-               for idx, (term, definition) in enumerate(config.vocabulary.items())
-           ] if config and config.vocabulary else [],
-           
-           # Messages d'erreur (simulés)
-           'errorMessages': [
-               {
-                   'title': 'Dépassement du temps de réponse',
-                   'code': 'TIMEOUT',
-                   'content': 'Je prends un peu plus de temps que prévu pour traiter votre demande. Pouvez-vous patienter quelques instants ou reformuler votre question ?'
-               },
-               {
-                   'title': 'Erreur technique',
-                   'code': 'SYSTEM_ERROR',
-                   'content': 'Je rencontre un petit problème technique. Pouvez-vous réessayer dans quelques minutes ? Si le problème persiste, contactez notre support.'
-               },
-               {
-                   'title': 'Limite atteinte',
-                   'code': 'RATE_LIMIT',
-                   'content': 'Vous avez fait beaucoup de demandes récemment. Merci de patienter quelques minutes avant de continuer.'
-               }
-           ],
-           
-           # Configuration du comportement
-           'behaviorConfig': {
-               'correspondance_flexible': True,
-               'réponses_contextuelles': True,
-               'mode_strict': False
+           {
+               'title': 'Erreur technique',
+               'code': 'SYSTEM_ERROR',
+               'content': 'Je rencontre un petit problème technique. Pouvez-vous réessayer dans quelques minutes ? Si le problème persiste, contactez notre support.'
            },
-           
-           # Métadonnées
-           'lastModified': datetime.utcnow().isoformat(),
-           'version': '2.0'
-       }
+           {
+               'title': 'Limite atteinte',
+               'code': 'RATE_LIMIT',
+               'content': 'Vous avez fait beaucoup de demandes récemment. Merci de patienter quelques minutes avant de continuer.'
+           }
+       ],
        
-       return jsonify(configuration)
+       # Configuration du comportement
+       'behaviorConfig': {
+           'correspondance_flexible': True,
+           'réponses_contextuelles': True,
+           'mode_strict': False
+       },
        
-   except Exception as e:
-       logger.error(f"Erreur récupération configuration: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+       # Métadonnées
+       'lastModified': datetime.utcnow(),
+       'version': '2.0'
+   }
+
+   return configuration
+
+
+@responses_bp.route('/api/configuration', methods=['GET'])
+@login_required
+@catch_errors('Erreur récupération configuration')
+def get_responses_configuration():
+   """Récupère toute la configuration des réponses (corps mis en cache, 304 si inchangé)."""
+   entry = _config_body_cache['data']
+   if entry is None or time.time() - _config_body_cache['mtime'] >= CONFIG_BODY_CACHE_TTL:
+       body = orjson.dumps(_build_config_dict())
+       entry = (body, hashlib.sha1(body).hexdigest())
+       _config_body_cache['data'] = entry
+       _config_body_cache['mtime'] = time.time()
+   
+   body, etag = entry
+   response = current_app.response_class(body, mimetype='application/json')
+   response.set_etag(etag)
+   return response.make_conditional(request)
 
 @responses_bp.route('/api/configuration', methods=['POST'])
 @login_required
+@catch_errors('Erreur sauvegarde configuration', rollback=True)
 def save_responses_configuration():
    """Sauvegarde toute la configuration des réponses."""
-   try:
-       data = request.get_json()
-       if not data:
-           return jsonify({'error': 'Données manquantes'}), 400
-       
-       # Sauvegarder le message de bienvenue
-       if 'welcomeMessage' in data:
-           settings = Settings.query.first()
-           if not settings:
-               settings = Settings()
-               db.session.add(settings)
-           settings.bot_welcome = data['welcomeMessage']
-       
-       # Sauvegarder les réponses personnalisées
-       if 'customResponses' in data:
-           # Supprimer les anciens messages par défaut
-           DefaultMessage.query.delete()
-           
-           # Créer les nouveaux
-           for response_data in data['customResponses']:
-               if response_data.get('keywords') and response_data.get('content'):
-                   message = DefaultMessage(
-                       title=f"Réponse: {response_data['keywords'][0] if response_data['keywords'] else 'Custom'}",
-                       content=response_data['content'],
-                       triggers=','.join(response_data['keywords'])
-                   )
-                   db.session.add(message)
-       
-       # Sauvegarder le vocabulaire métier
-       if 'vocabulary' in data:
-           config = BotResponses.query.first()
-           if not config:
-               config = BotResponses()
-               db.session.add(config)
-           
-           vocabulary_dict = {}
-           for vocab_item in data['vocabulary']:
-               if vocab_item.get('term') and vocab_item.get('definition'):
-                   vocabulary_dict[vocab_item['term']] = vocab_item['definition']
-           
-           config.vocabulary = vocabulary_dict
-       
-       # Sauvegarder les messages d'erreur (si nécessaire, créer une table dédiée)
-       # Pour l'instant, on les ignore car ils sont simulés
-       
-       db.session.commit()
+   data = request.get_json()
+   if not data:
+       return jsonify({'error': 'Données manquantes'}), 400
+   
+   # Sauvegarder le message de bienvenue
+   if 'welcomeMessage' in data:
+       settings = Settings.query.first()
+       if not settings:
+           settings = Settings()
+           db.session.add(settings)
+       settings.bot_welcome = data['welcomeMessage']
+   
+   # Sauvegarder les réponses personnalisées
+   if 'customResponses' in data:
+       # Supprimer les anciens messages par défaut
+       DefaultMessage.query.delete(synchronize_session=False)
        
-       # Rafraîchir le cache des réponses rapides
-       try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
-           logger.info("Cache des réponses rapides rafraîchi après sauvegarde")
-       except Exception as e:
-           logger.error(f"Erreur rafraîchissement cache: {str(e)}")
+       # Créer les nouveaux en un seul INSERT multi-lignes
+       rows = [
+           {
+               'title': f"Réponse: {response_data['keywords'][0]}",
+               'content': response_data['content'],
+               'triggers': DefaultMessage.join_triggers(response_data['keywords'])
+           }
+           for response_data in data['customResponses']
+           if response_data.get('keywords') and response_data.get('content')
+       ]
+       if rows:
+           db.session.bulk_insert_mappings(DefaultMessage, rows)
        
-       logger.info(f"Configuration des réponses sauvegardée par {current_user.username}")
+       # Suppression et insertion en masse échappent au flush : signaler la table
+       # pour que les caches soient invalidés après le commit
+       touch_on_commit(DefaultMessage)
+   
+   # Sauvegarder le vocabulaire métier
+   if 'vocabulary' in data:
+       config = BotResponses.query.first()
+       if not config:
+           config = BotResponses()
+           db.session.add(config)
        
-       return jsonify({
-           'success': True,
-           'message': 'Configuration sauvegardée avec succès',
-           'timestamp': datetime.utcnow().isoformat()
-       })
+       vocabulary_dict = {}
+       for vocab_item in data['vocabulary']:
+           if vocab_item.get('term') and vocab_item.get('definition'):
+               vocabulary_dict[vocab_item['term']] = vocab_item['definition']
        
+       config.vocabulary = vocabulary_dict
+   
+   # Sauvegarder les messages d'erreur (si nécessaire, créer une table dédiée)
+   # Pour l'instant, on les ignore car ils sont simulés
+   
+   db.session.commit()
+   _invalidate_fast_responses_cache()
+   
+   # Rafraîchir le cache des réponses rapides
+   try:
+       from .fast_responses_cache import schedule_refresh
+       schedule_refresh()
+       logger.info("Rafraîchissement du cache des réponses rapides planifié après sauvegarde")
    except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur sauvegarde configuration: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+       logger.error(f"Erreur rafraîchissement cache: {str(e)}")
+   
+   logger.info(f"Configuration des réponses sauvegardée par {current_user.username}")
+   
+   return jsonify({
+       'success': True,
+       'message': 'Configuration sauvegardée avec succès',
+       'timestamp': datetime.utcnow()
+   })
+
+# Réponses de base testées avant les messages personnalisés (ordre = priorité)
+_TEST_SIMPLE_RESPONSES = (
+   ('bonjour', 'Bonjour ! Comment puis-je vous aider aujourd\'hui ?'),
+   ('salut', 'Salut ! Que puis-je faire pour toi ?'),
+   ('au revoir', 'Au revoir, bonne journée !'),
+   ('merci', 'De rien, ravi d\'avoir pu vous aider !'),
+)
 
 @responses_bp.route('/api/test-response', methods=['POST'])
 @login_required
+@catch_errors('Erreur test réponse')
 def test_response():
    """Teste une réponse automatique."""
-   try:
-       data = request.get_json()
-       test_message = data.get('message', '').lower()
-       
-       if not test_message:
-           return jsonify({'error': 'Message de test requis'}), 400
-       
-       # Logique de test simple (à améliorer)
-       responses = {
-           'bonjour': 'Bonjour ! Comment puis-je vous aider aujourd\'hui ?',
-           'salut': 'Salut ! Que puis-je faire pour toi ?',
-           'au revoir': 'Au revoir, bonne journée !',
-           'merci': 'De rien, ravi d\'avoir pu vous aider !',
-       }
-       
-       # Recherche de correspondance
-       matched_response = None
-       matched_trigger = None
-       
-       for trigger, response in responses.items():
-           if trigger in test_message:
-               matched_response = response
-               matched_trigger = trigger
-               break
-       
-       # Vérifier aussi les messages personnalisés
-       if not matched_response:
-           default_messages = DefaultMessage.query.all()
-           for msg in default_messages:
-               if msg.triggers:
-                   triggers = [t.strip().lower() for t in msg.triggers.split(',')]
-                   for trigger in triggers:
-                       if trigger in test_message:
-                           matched_response = msg.content
-                           matched_trigger = trigger
-                           break
-                   if matched_response:
-                       break
-       
-       if not matched_response:
-           matched_response = "Pourriez-vous reformuler votre question ? Je veux être sûr de bien vous aider."
-           matched_trigger = "défaut"
-       
-       return jsonify({
-           'success': True,
-           'response': matched_response,
-           'trigger': matched_trigger,
-           'message': test_message,
-           'processing_time': '2ms'
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur test réponse: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   data = request.get_json(silent=True, cache=False) or {}
+   test_message = data.get('message', '').lower()
+   
+   if not test_message:
+       return jsonify({'error': 'Message de test requis'}), 400
+   
+   # Recherche de correspondance
+   matched_response = None
+   matched_trigger = None
+   
+   for trigger, response in _TEST_SIMPLE_RESPONSES:
+       if trigger in test_message:
+           matched_response = response
+           matched_trigger = trigger
+           break
+   
+   # Vérifier aussi les messages personnalisés : automate du gestionnaire de cache,
+   # sans requête tant que les messages n'ont pas changé
+   if not matched_response:
+       result = response_cache_manager.find_matching_response(test_message)
+       if result['found']:
+           matched_response = result['response']['content']
+           matched_trigger = result['trigger'].lower()
+   
+   if not matched_response:
+       matched_response = "Pourriez-vous reformuler votre question ? Je veux être sûr de bien vous aider."
+       matched_trigger = "défaut"
+   
+   return jsonify({
+       'success': True,
+       'response': matched_response,
+       'trigger': matched_trigger,
+       'message': test_message,
+       'processing_time': '2ms'
+   })
 
 # Autres routes pour la gestion du vocabulaire (mises à jour)
 @responses_bp.route('/api/vocabulary', methods=['GET'])
 @login_required
+@catch_errors('Erreur récupération vocabulaire')
 def get_vocabulary():
    """Récupère le vocabulaire métier."""
-   try:
-       config = BotResponses.query.first()
-       
-       if not config or not config.vocabulary:
-           return jsonify([])
-       
-       vocabulary_list = [
-           {
-               'id': idx + 1,
-               'term': term,
-               'definition': definition
-           }
-           for idx, (term, definition) in enumerate(config.vocabulary.items())
-       ]
-       
-       return jsonify(vocabulary_list)
-       
-   except Exception as e:
-       logger.error(f"Erreur récupération vocabulaire: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   # Instantané mémoïsé, invalidé par les listeners ORM à chaque écriture sur BotResponses
+   config = get_bot_responses_cached()
+   vocabulary = config.vocabulary if config else None
+   
+   if not vocabulary:
+       return json_response([])
+   
+   vocabulary_list = [
+       {
+           'id': idx + 1,
+           'term': term,
+           'definition': definition
+       }
+       for idx, (term, definition) in enumerate(vocabulary.items())
+   ]
+   
+   return json_response(vocabulary_list)
+
+def _vocabulary_key(vocabulary, term_id):
+   """Terme d'identifiant term_id (position 1-based), sans copier la liste des entrées."""
+   if term_id <= 0 or term_id > len(vocabulary):
+       return None
+   return next(islice(vocabulary, term_id - 1, None))
 
 @responses_bp.route('/api/vocabulary', methods=['POST'])
 @login_required
+@catch_errors('Erreur ajout vocabulaire', rollback=True)
 def create_vocabulary_term():
    """Ajoute un terme au vocabulaire."""
-   try:
-       data = request.get_json()
-       
-       if not data or 'term' not in data or 'definition' not in data:
-           return jsonify({'error': 'Terme et définition requis'}), 400
-       
-       config = BotResponses.query.first()
-       if not config:
-           config = BotResponses()
-           config.vocabulary = {}
-           db.session.add(config)
-       
-       if not config.vocabulary:
-           config.vocabulary = {}
-       
-       # Ajouter le nouveau terme
-       config.vocabulary[data['term']] = data['definition']
-       
-       # Marquer comme modifié pour SQLAlchemy
-       flag_modified(config, 'vocabulary')
-       
-       db.session.commit()
-       
-       logger.info(f"Terme de vocabulaire ajouté: {data['term']}")
-       
-       return jsonify({
-           'success': True,
-           'id': len(config.vocabulary),
-           'term': data['term'],
-           'definition': data['definition']
-       })
-       
-   except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur ajout vocabulaire: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   data = request.get_json()
+   
+   if not data or 'term' not in data or 'definition' not in data:
+       return jsonify({'error': 'Terme et définition requis'}), 400
+   
+   config = BotResponses.query.first()
+   if not config:
+       config = BotResponses()
+       config.vocabulary = {}
+       db.session.add(config)
+   
+   if not config.vocabulary:
+       config.vocabulary = {}
+   
+   # Ajouter le nouveau terme
+   config.vocabulary[data['term']] = data['definition']
+   
+   # Marquer comme modifié pour SQLAlchemy
+   flag_modified(config, 'vocabulary')
+   
+   db.session.commit()
+   
+   logger.info(f"Terme de vocabulaire ajouté: {data['term']}")
+   
+   return jsonify({
+       'success': True,
+       'id': len(config.vocabulary),
+       'term': data['term'],
+       'definition': data['definition']
+   })
 
 @responses_bp.route('/api/vocabulary/<int:term_id>', methods=['PUT'])
 @login_required
+@catch_errors('Erreur mise à jour vocabulaire', rollback=True)
 def update_vocabulary_term(term_id):
    """Met à jour un terme du vocabulaire."""
-   try:
-       data = request.get_json()
-       
-       if not data or 'term' not in data or 'definition' not in data:
-           return jsonify({'error': 'Terme et définition requis'}), 400
-       
-       config = BotResponses.query.first()
-       if not config or not config.vocabulary:
-           return jsonify({'error': 'Vocabulaire non trouvé'}), 404
-       
-       # Trouver le terme par index (approximatif)
-       vocab_items = list(config.vocabulary.items())
-       if term_id <= 0 or term_id > len(vocab_items):
-           return jsonify({'error': 'Terme non trouvé'}), 404
-       
-       old_term = vocab_items[term_id - 1][0]
-       
-       # Supprimer l'ancien terme et ajouter le nouveau
+   data = request.get_json()
+   
+   if not data or 'term' not in data or 'definition' not in data:
+       return jsonify({'error': 'Terme et définition requis'}), 400
+   
+   config = BotResponses.query.first()
+   if not config or not config.vocabulary:
+       return jsonify({'error': 'Vocabulaire non trouvé'}), 404
+   
+   old_term = _vocabulary_key(config.vocabulary, term_id)
+   if old_term is None:
+       return jsonify({'error': 'Terme non trouvé'}), 404
+   
+   # Même terme : mise à jour sur place, sans changer sa position (donc son id)
+   if data['term'] != old_term:
        del config.vocabulary[old_term]
-       config.vocabulary[data['term']] = data['definition']
-       
-       flag_modified(config, 'vocabulary')
-       db.session.commit()
-       
-       logger.info(f"Terme de vocabulaire mis à jour: {old_term} -> {data['term']}")
-       
-       return jsonify({
-           'success': True,
-           'id': term_id,
-           'term': data['term'],
-           'definition': data['definition']
-       })
-       
-   except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur mise à jour vocabulaire: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   config.vocabulary[data['term']] = data['definition']
+   
+   flag_modified(config, 'vocabulary')
+   db.session.commit()
+   
+   logger.info(f"Terme de vocabulaire mis à jour: {old_term} -> {data['term']}")
+   
+   return jsonify({
+       'success': True,
+       'id': term_id,
+       'term': data['term'],
+       'definition': data['definition']
+   })
 
 @responses_bp.route('/api/vocabulary/<int:term_id>', methods=['DELETE'])
 @login_required
+@catch_errors('Erreur suppression vocabulaire', rollback=True)
 def delete_vocabulary_term(term_id):
    """Supprime un terme du vocabulaire."""
-   try:
-       config = BotResponses.query.first()
-       if not config or not config.vocabulary:
-           return jsonify({'error': 'Vocabulaire non trouvé'}), 404
-       
-       # Trouver le terme par index
-       vocab_items = list(config.vocabulary.items())
-       if term_id <= 0 or term_id > len(vocab_items):
-           return jsonify({'error': 'Terme non trouvé'}), 404
-       
-       term_to_delete = vocab_items[term_id - 1][0]
-       
-       # Supprimer le terme
-       del config.vocabulary[term_to_delete]
-       
-       flag_modified(config, 'vocabulary')
-       db.session.commit()
-       
-       logger.info(f"Terme de vocabulaire supprimé: {term_to_delete}")
-       
-       return jsonify({'success': True})
-       
-   except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur suppression vocabulaire: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   config = BotResponses.query.first()
+   if not config or not config.vocabulary:
+       return jsonify({'error': 'Vocabulaire non trouvé'}), 404
+   
+   term_to_delete = _vocabulary_key(config.vocabulary, term_id)
+   if term_to_delete is None:
+       return jsonify({'error': 'Terme non trouvé'}), 404
+   
+   # Supprimer le terme
+   del config.vocabulary[term_to_delete]
+   
+   flag_modified(config, 'vocabulary')
+   db.session.commit()
+   
+   logger.info(f"Terme de vocabulaire supprimé: {term_to_delete}")
+   
+   return jsonify({'success': True})
 
 
 # ========================
@@ -1314,14 +1650,22 @@ def delete_vocabulary_term(term_id):
 # ========================
 @main_bp.route("/api/default-messages", methods=['GET'])
 @login_required
+@catch_errors('Erreur récupération messages par défaut')
 def get_default_messages():
    """Récupère tous les messages par défaut."""
-   try:
-       messages = DefaultMessage.query.all()
-       return jsonify([message.to_dict() for message in messages])
-   except Exception as e:
-       logger.error(f"Erreur récupération messages par défaut: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   # Colonnes utiles uniquement, sans instancier d'objets ORM (même forme que to_dict)
+   rows = db.session.query(
+       DefaultMessage.id, DefaultMessage.title, DefaultMessage.content, DefaultMessage.triggers
+   )
+   return json_response([
+       {
+           'id': row.id,
+           'title': row.title,
+           'content': row.content,
+           'triggers': DefaultMessage.split_triggers(row.triggers)
+       }
+       for row in rows
+   ])
 
 @main_bp.route("/api/default-messages", methods=['POST'])
 @login_required
@@ -1335,17 +1679,18 @@ def create_default_message():
        message = DefaultMessage(
            title=data.get('title', 'Nouveau message'),
            content=data.get('content', ''),
-           triggers=','.join(data.get('triggers', []) if isinstance(data.get('triggers'), list) else [])
+           trigger_list=data.get('triggers') if isinstance(data.get('triggers'), list) else []
        )
        
        db.session.add(message)
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
-           logger.info("Cache des réponses rapides rafraîchi")
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
+           logger.info("Rafraîchissement du cache des réponses rapides planifié")
        except Exception as e:
            logger.error(f"Erreur lors du rafraîchissement du cache: {str(e)}")
        
@@ -1368,17 +1713,15 @@ def update_default_message(message_id):
        message.title = data.get('title', message.title)
        message.content = data.get('content', message.content)
        if 'triggers' in data:
-           if isinstance(data['triggers'], list):
-               message.triggers = ','.join(data['triggers'])
-           else:
-               message.triggers = data['triggers']
+           message.trigger_list = data['triggers']
        
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
        except Exception as e:
            logger.error(f"Erreur lors du rafraîchissement du cache: {str(e)}")
        
@@ -1398,11 +1741,12 @@ def delete_default_message(message_id):
        message = DefaultMessage.query.get_or_404(message_id)
        db.session.delete(message)
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
        except Exception as e:
            logger.error(f"Erreur lors du rafraîchissement du cache: {str(e)}")
        
@@ -1437,7 +1781,7 @@ def config_api():
    # Récupérer la config actuelle de l'utilisateur
    current_config = {}
    try:
-       user_settings = Settings.query.filter_by(user_id=current_user.id).first()
+       user_settings = current_user.settings
        if user_settings:
            current_config = {
                'provider': user_settings.current_provider,
@@ -1473,22 +1817,23 @@ def config_api():
 @login_required
 def general_settings():
    """Gestion des paramètres généraux du bot."""
-   settings = Settings.query.first()
-   if not settings:
-       settings = Settings()
-       db.session.add(settings)
-       db.session.commit()
-
    if request.method == "POST":
-       bot_name = request.form.get("bot-name", "").strip()
-       description = request.form.get("description", "").strip()
-       welcome_msg = request.form.get("welcome-message", "").strip()
+       settings = Settings.query.first()
+       if not settings:
+           # Normalement créé au démarrage par init_default_data()
+           settings = Settings()
+           db.session.add(settings)
+
+       vals = _form_strs("bot-name", "description", "welcome-message")
+       bot_name = vals["bot-name"]
+       description = vals["description"]
+       welcome_msg = vals["welcome-message"]
        avatar_file = request.files.get("avatar")
 
        if avatar_file and avatar_file.filename:
-           filename = secure_filename(avatar_file.filename)
+           filename = _secure_filename(avatar_file.filename)
            ext = os.path.splitext(filename)[1].lower()
-           if ext in [".jpeg", ".jpg", ".png", ".bmp", ".webp", ".avif"]:
+           if ext in _AVATAR_EXTENSIONS:
                upload_dir = os.path.join(current_app.root_path, "static", "uploads")
                if not os.path.exists(upload_dir):
                    os.makedirs(upload_dir)
@@ -1507,11 +1852,11 @@ def general_settings():
        try:
            db.session.commit()
            
-           # Rafraîchir le cache après modification des paramètres
+           # Invalider uniquement les clés modifiées plutôt que tout le cache
            try:
-               from .fast_responses_cache import refresh_cache
-               refresh_cache()
-               logger.info("Cache rafraîchi après modification des paramètres généraux")
+               from .fast_responses_cache import invalidate_keys
+               invalidate_keys(['bot_name', 'bot_description', 'bot_welcome'])
+               logger.info("Cache invalidé après modification des paramètres généraux")
            except Exception as e:
                logger.error(f"Erreur lors du rafraîchissement du cache: {str(e)}")
            
@@ -1549,11 +1894,15 @@ def delete_avatar():
 @main_bp.route("/api/get_general_settings", methods=["GET"])
 def get_general_settings():
    """API pour récupérer les paramètres généraux."""
-   settings = Settings.query.first()
+   settings = get_settings_cached()
    if not settings:
-       settings = Settings()
-       db.session.add(settings)
-       db.session.commit()
+       # Pas d'écriture sur une route GET : la ligne est créée au démarrage
+       return jsonify({
+           "bot_name": "MonChatbot",
+           "bot_description": None,
+           "bot_welcome": "Bienvenue!",
+           "bot_avatar": None
+       })
    return jsonify({
        "bot_name": settings.bot_name,
        "bot_description": settings.bot_description,
@@ -1569,13 +1918,15 @@ def get_general_settings():
 def smtp_settings():
    """Configuration SMTP pour l'envoi d'emails."""
    if request.method == "POST":
-       smtp_server = request.form.get("smtp_server", "").strip()
-       smtp_port = request.form.get("smtp_port", "").strip()
-       smtp_username = request.form.get("smtp_username", "").strip()
-       smtp_password = request.form.get("smtp_password", "").strip()
-       smtp_security = request.form.get("smtp_security", "").strip()
-       from_email = request.form.get("from_email", "").strip()
-       from_name = request.form.get("from_name", "").strip()
+       vals = _form_strs("smtp_server", "smtp_port", "smtp_username", "smtp_password",
+                         "smtp_security", "from_email", "from_name")
+       smtp_server = vals["smtp_server"]
+       smtp_port = vals["smtp_port"]
+       smtp_username = vals["smtp_username"]
+       smtp_password = vals["smtp_password"]
+       smtp_security = vals["smtp_security"]
+       from_email = vals["from_email"]
+       from_name = vals["from_name"]
 
        if not all([smtp_server, smtp_port, smtp_username, smtp_security, from_email, from_name]):
            flash("Tous les champs (sauf le mot de passe) sont obligatoires.", "error")
@@ -1631,7 +1982,7 @@ def sms_configuration():
        sms_provider = request.form.get("sms_provider", "").strip()
        env_path = os.path.join(current_app.root_path, '.env')
        
-       if sms_provider not in ["twilio", "vonage"]:
+       if sms_provider not in _SMS_PROVIDERS:
            flash("Veuillez sélectionner un fournisseur SMS valide.", "error")
            return redirect(url_for("main.sms_configuration"))
        
@@ -1640,9 +1991,10 @@ def sms_configuration():
            current_app.config["SMS_PROVIDER"] = sms_provider
 
            if sms_provider == "twilio":
-               twilio_account_sid = request.form.get("twilio_account_sid", "").strip()
-               twilio_auth_token = request.form.get("twilio_auth_token", "").strip()
-               twilio_from = request.form.get("twilio_from", "").strip()
+               vals = _form_strs("twilio_account_sid", "twilio_auth_token", "twilio_from")
+               twilio_account_sid = vals["twilio_account_sid"]
+               twilio_auth_token = vals["twilio_auth_token"]
+               twilio_from = vals["twilio_from"]
                
                if not all([twilio_account_sid, twilio_auth_token, twilio_from]):
                    flash("Tous les champs Twilio sont obligatoires.", "error")
@@ -1659,9 +2011,10 @@ def sms_configuration():
                })
                
            elif sms_provider == "vonage":
-               vonage_api_key = request.form.get("vonage_api_key", "").strip()
-               vonage_api_secret = request.form.get("vonage_api_secret", "").strip()
-               vonage_from = request.form.get("vonage_from", "").strip()
+               vals = _form_strs("vonage_api_key", "vonage_api_secret", "vonage_from")
+               vonage_api_key = vals["vonage_api_key"]
+               vonage_api_secret = vals["vonage_api_secret"]
+               vonage_from = vals["vonage_from"]
                
                if not all([vonage_api_key, vonage_api_secret, vonage_from]):
                    flash("Tous les champs Vonage sont obligatoires.", "error")
@@ -1803,7 +2156,7 @@ def upload_document():
        return jsonify({'success': False, 'error': 'Nom de fichier invalide'}), 400
    
    try:
-       filename = secure_filename(file.filename)
+       filename = _secure_filename(file.filename)
        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
        file.save(file_path)
        
@@ -1938,163 +2291,154 @@ def unauthorized_error(error):
 # ========================
 @main_bp.route("/api/system/stats", methods=["GET"])
 @login_required
+@catch_errors('Erreur dans system_stats')
 def system_stats():
    """Statistiques du système - Mode clés utilisateur."""
-   try:
-       # Stats utilisateur actuel
-       user_config = get_user_api_config()
-       
-       stats = {
-           "mode": "user_keys_api",
-           "backend_services": {
-               "database": "active",
-               "session_management": "active",
-               "context_builder": "active" if context_builder else "inactive",
-               "cache": "active",
-               "encryption": "active" if current_app.config.get('ENCRYPTION_KEY') else "inactive"
-           },
-           "user_api_status": {
-               "has_config": bool(user_config),
-               "provider": user_config.get('provider') if user_config else None,
-               "model": user_config.get('model') if user_config else None,
-               "encryption_enabled": True
-           },
-           "session_stats": {
-               "user_id": current_user.id,
-               "conversation_history": len(session.get('conversation_history', [])),
-               "session_id": session.get('session_id', 'none')
-           }
+   # Stats utilisateur actuel
+   user_config = get_user_api_config()
+   
+   stats = {
+       "mode": "user_keys_api",
+       "backend_services": {
+           "database": "active",
+           "session_management": "active",
+           "context_builder": "active" if context_builder else "inactive",
+           "cache": "active",
+           "encryption": "active" if current_app.config.get('ENCRYPTION_KEY') else "inactive"
+       },
+       "user_api_status": {
+           "has_config": bool(user_config),
+           "provider": user_config.get('provider') if user_config else None,
+           "model": user_config.get('model') if user_config else None,
+           "encryption_enabled": True
+       },
+       "session_stats": {
+           "user_id": current_user.id,
+           "conversation_history": len(session.get('conversation_history', [])),
+           "session_id": session.get('session_id', 'none')
        }
-       
-       return jsonify(stats)
-       
-   except Exception as e:
-       logger.error(f"Erreur dans system_stats: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   }
+   
+   return jsonify(stats)
 
 @main_bp.route("/api/cache/clear", methods=["POST"])
 @login_required
+@catch_errors('Erreur lors du vidage des caches')
 def clear_cache():
    """Vide tous les caches."""
-   try:
-       # Vider le cache des réponses rapides
-       from .fast_responses_cache import refresh_cache
-       refresh_cache()
-       
-       # Vider le cache du context builder
-       global context_builder
-       if context_builder and hasattr(context_builder, '_cache'):
-           context_builder._cache.clear()
-       
-       # Vider l'historique de session
-       if 'conversation_history' in session:
-           session['conversation_history'] = []
-           session.modified = True
-       
-       logger.info(f"Caches vidés pour l'utilisateur {current_user.username}")
-       
-       return jsonify({
-           "message": "Caches vidés avec succès",
-           "timestamp": datetime.utcnow().isoformat(),
-           "mode": "user_keys_api"
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur lors du vidage des caches: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   # Vider le cache des réponses rapides
+   from .fast_responses_cache import refresh_cache
+   refresh_cache()
+   
+   # Vider le cache du context builder
+   global context_builder
+   if context_builder and hasattr(context_builder, '_cache'):
+       context_builder._cache.clear()
+   
+   # Vider l'historique de session
+   if 'conversation_history' in session:
+       session['conversation_history'] = []
+       session.modified = True
+   
+   logger.info(f"Caches vidés pour l'utilisateur {current_user.username}")
+   
+   return jsonify({
+       "message": "Caches vidés avec succès",
+       "timestamp": datetime.utcnow().isoformat(),
+       "mode": "user_keys_api"
+   })
 
 @main_bp.route("/api/test/context", methods=["POST"])
 @login_required
+@catch_errors('Erreur dans test_context')
 def test_context():
    """Teste la génération de contexte."""
-   try:
-       data = request.get_json()
-       test_message = data.get("message", "")
-       
-       if not test_message:
-           return jsonify({"error": "Message de test requis"}), 400
-       
-       global context_builder
-       if not context_builder:
-           context_builder = ContextBuilder(current_app)
-       
-       enriched_prompt, metadata = context_builder.build_system_prompt(
-           user_message=test_message,
-           session_context={
-               'user_id': current_user.id,
-               'session_id': session.get('session_id', 'test'),
-               'conversation_history': []
-           }
-       )
-       
-       return jsonify({
-           "message": test_message,
-           "metadata": metadata,
-           "prompt_length": len(enriched_prompt),
-           "prompt_preview": enriched_prompt[:500] + "..." if len(enriched_prompt) > 500 else enriched_prompt,
-           "full_prompt": enriched_prompt if data.get("show_full", False) else None,
-           "mode": "user_keys_api",
-           "user_id": current_user.id
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur dans test_context: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   data = request.get_json(silent=True, cache=False) or {}
+   test_message = data.get("message", "")
+   
+   if not test_message:
+       return jsonify({"error": "Message de test requis"}), 400
+   
+   global context_builder
+   if not context_builder:
+       context_builder = ContextBuilder(current_app)
+   
+   enriched_prompt, metadata = context_builder.build_system_prompt(
+       user_message=test_message,
+       session_context={
+           'user_id': current_user.id,
+           'session_id': session.get('session_id', 'test'),
+           'conversation_history': []
+       }
+   )
+   
+   return jsonify({
+       "message": test_message,
+       "metadata": metadata,
+       "prompt_length": len(enriched_prompt),
+       "prompt_preview": enriched_prompt[:500] + "..." if len(enriched_prompt) > 500 else enriched_prompt,
+       "full_prompt": enriched_prompt if data.get("show_full", False) else None,
+       "mode": "user_keys_api",
+       "user_id": current_user.id
+   })
 
 @main_bp.route("/api/user/usage-stats", methods=["GET"])
 @login_required
+@catch_errors('Erreur user_usage_stats')
 def user_usage_stats():
    """Statistiques d'utilisation de l'utilisateur connecté."""
-   try:
-       # Statistiques basiques depuis la session
-       conversation_history = session.get('conversation_history', [])
-       
-       # Compter les messages par provider
-       provider_usage = {}
-       total_messages = len(conversation_history)
-       identity_corrections = 0
-       
-       for message in conversation_history:
-           provider = message.get('provider', 'unknown')
-           provider_usage[provider] = provider_usage.get(provider, 0) + 1
-           if message.get('identity_corrected', False):
-               identity_corrections += 1
-       
-       # Calculer les moyennes de complexité
-       complexities = [msg.get('complexity', 1) for msg in conversation_history]
-       avg_complexity = sum(complexities) / len(complexities) if complexities else 0
-       
-       # Stats récentes (dernières 24h)
-       recent_cutoff = int(time.time()) - (24 * 3600)
-       recent_messages = [msg for msg in conversation_history if msg.get('timestamp', 0) > recent_cutoff]
-       
-       stats = {
-           "user_id": current_user.id,
-           "username": current_user.username,
-           "total_messages": total_messages,
-           "recent_messages_24h": len(recent_messages),
-           "provider_usage": provider_usage,
-           "average_complexity": round(avg_complexity, 2),
-           "identity_corrections": identity_corrections,
-           "correction_rate": round((identity_corrections / max(total_messages, 1)) * 100, 1),
-           "session_id": session.get('session_id'),
-           "last_activity": max([msg.get('timestamp', 0) for msg in conversation_history]) if conversation_history else None,
-           "knowledge_usage": sum(1 for msg in conversation_history if msg.get('has_knowledge', False)),
-           "timestamp": datetime.utcnow().isoformat()
-       }
-       
-       return jsonify(stats)
-       
-   except Exception as e:
-       logger.error(f"Erreur user_usage_stats: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   # Statistiques basiques depuis la session
+   conversation_history = session.get('conversation_history', [])
+   
+   # Une seule passe sur l'historique pour tous les compteurs
+   provider_usage = {}
+   total_messages = len(conversation_history)
+   identity_corrections = 0
+   complexity_sum = 0
+   recent_messages = 0
+   knowledge_usage = 0
+   last_activity = 0
+   recent_cutoff = int(time.time()) - (24 * 3600)  # Stats récentes (dernières 24h)
+   
+   for message in conversation_history:
+       provider = message.get('provider', 'unknown')
+       provider_usage[provider] = provider_usage.get(provider, 0) + 1
+       complexity_sum += message.get('complexity', 1)
+       timestamp = message.get('timestamp', 0)
+       if timestamp > recent_cutoff:
+           recent_messages += 1
+       if timestamp > last_activity:
+           last_activity = timestamp
+       if message.get('identity_corrected', False):
+           identity_corrections += 1
+       if message.get('has_knowledge', False):
+           knowledge_usage += 1
+   
+   avg_complexity = complexity_sum / total_messages if total_messages else 0
+   
+   stats = {
+       "user_id": current_user.id,
+       "username": current_user.username,
+       "total_messages": total_messages,
+       "recent_messages_24h": recent_messages,
+       "provider_usage": provider_usage,
+       "average_complexity": round(avg_complexity, 2),
+       "identity_corrections": identity_corrections,
+       "correction_rate": round((identity_corrections / max(total_messages, 1)) * 100, 1),
+       "session_id": session.get('session_id'),
+       "last_activity": last_activity if conversation_history else None,
+       "knowledge_usage": knowledge_usage,
+       "timestamp": datetime.utcnow().isoformat()
+   }
+   
+   return jsonify(stats)
 
 @main_bp.route("/api/user/reset-config", methods=["POST"])
 @login_required
 def reset_user_config():
    """Remet à zéro la configuration API de l'utilisateur."""
    try:
-       user_settings = Settings.query.filter_by(user_id=current_user.id).first()
+       user_settings = current_user.settings
        
        if user_settings:
            # Supprimer les clés chiffrées
@@ -2157,38 +2501,41 @@ def check_status(request_id):
 # ========================
 @main_bp.route("/api/export/conversation", methods=["GET"])
 @login_required
+@catch_errors('Erreur export_conversation')
 def export_conversation():
    """Exporte l'historique de conversation de l'utilisateur."""
-   try:
-       conversation_history = session.get('conversation_history', [])
-       
-       export_data = {
-           "user_id": current_user.id,
-           "username": current_user.username,
-           "export_date": datetime.utcnow().isoformat(),
-           "total_messages": len(conversation_history),
-           "conversation_history": conversation_history,
-           "session_id": session.get('session_id')
-       }
-       
-       # Créer la réponse avec headers pour téléchargement
-       response = make_response(jsonify(export_data))
-       response.headers['Content-Disposition'] = f'attachment; filename=conversation_{current_user.username}_{int(time.time())}.json'
-       response.headers['Content-Type'] = 'application/json'
-       
-       logger.info(f"Export conversation pour {current_user.username}")
-       
-       return response
-       
-   except Exception as e:
-       logger.error(f"Erreur export_conversation: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   conversation_history = session.get('conversation_history', [])
+   
+   export_data = {
+       "user_id": current_user.id,
+       "username": current_user.username,
+       "export_date": datetime.utcnow().isoformat(),
+       "total_messages": len(conversation_history),
+       "conversation_history": conversation_history,
+       "session_id": session.get('session_id')
+   }
+   
+   # Créer la réponse de téléchargement directement depuis les octets sérialisés
+   filename = f'conversation_{current_user.username}_{int(time.time())}.json'
+   
+   logger.info(f"Export conversation pour {current_user.username}")
+   
+   return send_file(
+       io.BytesIO(orjson.dumps(export_data)),
+       mimetype='application/json',
+       as_attachment=True,
+       download_name=filename
+   )
 
 @main_bp.route("/api/import/conversation", methods=["POST"])
 @login_required
 def import_conversation():
    """Importe un historique de conversation."""
    try:
+       # Rejeter les imports trop volumineux avant de lire le corps
+       if request.content_length and request.content_length > current_app.config.get('MAX_IMPORT_SIZE', Config.MAX_IMPORT_SIZE):
+           return jsonify({"error": "Fichier trop volumineux"}), 413
+       
        if 'file' not in request.files:
            return jsonify({"error": "Aucun fichier fourni"}), 400
        
@@ -2196,12 +2543,14 @@ def import_conversation():
        if file.filename == '':
            return jsonify({"error": "Nom de fichier invalide"}), 400
        
-       if not file.filename.endswith('.json'):
+       if os.path.splitext(file.filename)[1].lower() != '.json':
            return jsonify({"error": "Format de fichier non supporté (JSON requis)"}), 400
        
-       # Lire et parser le fichier JSON
-       content = file.read().decode('utf-8')
-       import_data = json.loads(content)
+       # Lire et parser le fichier JSON (orjson accepte directement les bytes)
+       raw = _read_import_file(file)
+       if raw is None:
+           return jsonify({"error": "Fichier trop volumineux"}), 413
+       import_data = orjson.loads(raw)
        
        # Valider la structure
        if 'conversation_history' not in import_data:
@@ -2222,7 +2571,7 @@ def import_conversation():
            "imported_count": imported_count
        })
        
-   except json.JSONDecodeError:
+   except orjson.JSONDecodeError:
        return jsonify({"error": "Fichier JSON invalide"}), 400
    except Exception as e:
        logger.error(f"Erreur import_conversation: {str(e)}")
@@ -2233,24 +2582,20 @@ def import_conversation():
 # WEBHOOK POUR NOTIFICATIONS (BONUS)
 # ========================
 @main_bp.route("/webhook/api-usage", methods=["POST"])
+@catch_errors('Erreur webhook')
 def webhook_api_usage():
    """Webhook pour recevoir des notifications d'usage API."""
-   try:
-       data = request.get_json()
-       
-       # Log des informations d'usage
-       logger.info(f"Webhook API usage: {data}")
-       
-       # Ici on pourrait implémenter:
-       # - Alertes de quota
-       # - Statistiques d'usage en temps réel
-       # - Facturation automatique
-       
-       return jsonify({"status": "received"}), 200
-       
-   except Exception as e:
-       logger.error(f"Erreur webhook: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   data = request.get_json()
+   
+   # Log des informations d'usage
+   logger.info(f"Webhook API usage: {data}")
+   
+   # Ici on pourrait implémenter:
+   # - Alertes de quota
+   # - Statistiques d'usage en temps réel
+   # - Facturation automatique
+   
+   return jsonify({"status": "received"}), 200
 
 
 # ========================
@@ -2258,49 +2603,41 @@ def webhook_api_usage():
 # ========================
 @main_bp.route("/api/security/audit-log", methods=["GET"])
 @login_required
+@catch_errors('Erreur audit_log')
 def security_audit_log():
    """Log d'audit de sécurité pour l'utilisateur."""
-   try:
-       # En production, ceci viendrait d'une vraie table d'audit
-       audit_events = [
-           {
-               "timestamp": datetime.utcnow().isoformat(),
-               "event": "config_access",
-               "user_id": current_user.id,
-               "ip_address": request.remote_addr,
-               "user_agent": request.headers.get('User-Agent', 'Unknown')
-           }
-       ]
-       
-       return jsonify({
-           "audit_events": audit_events,
-           "total_events": len(audit_events)
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur audit_log: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   # En production, ceci viendrait d'une vraie table d'audit
+   audit_events = [
+       {
+           "timestamp": datetime.utcnow().isoformat(),
+           "event": "config_access",
+           "user_id": current_user.id,
+           "ip_address": request.remote_addr,
+           "user_agent": request.headers.get('User-Agent', 'Unknown')
+       }
+   ]
+   
+   return jsonify({
+       "audit_events": audit_events,
+       "total_events": len(audit_events)
+   })
 
 @main_bp.route("/api/security/rotate-encryption", methods=["POST"])
 @login_required
+@catch_errors('Erreur rotate_encryption')
 def rotate_encryption_key():
    """Rotation de la clé de chiffrement (admin uniquement)."""
-   try:
-       # Vérifier les permissions admin
-       if not getattr(current_user, 'is_admin', False):  # Supposons qu'il y ait un champ is_admin
-           return jsonify({"error": "Permissions administrateur requises"}), 403
-       
-       # En production, implémenter la rotation des clés
-       logger.warning(f"Tentative de rotation de clé par {current_user.username}")
-       
-       return jsonify({
-           "message": "Rotation de clé programmée",
-           "status": "scheduled"
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur rotate_encryption: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   # Vérifier les permissions admin
+   if not getattr(current_user, 'is_admin', False):  # Supposons qu'il y ait un champ is_admin
+       return jsonify({"error": "Permissions administrateur requises"}), 403
+   
+   # En production, implémenter la rotation des clés
+   logger.warning(f"Tentative de rotation de clé par {current_user.username}")
+   
+   return jsonify({
+       "message": "Rotation de clé programmée",
+       "status": "scheduled"
+   })
 
 
 # ========================
@@ -2308,32 +2645,28 @@ def rotate_encryption_key():
 # ========================
 @main_bp.route("/api/test-identity", methods=["POST"])
 @login_required
+@catch_errors('Erreur test_identity_correction')
 def test_identity_correction():
    """Route de test pour vérifier la correction d'identité."""
-   try:
-       data = request.get_json()
-       test_response = data.get("response", "Je suis une assistante virtuelle conçue pour vous aider.")
-       
-       # Récupérer les infos du bot
-       global context_builder
-       if not context_builder:
-           context_builder = ContextBuilder(current_app)
-       
-       bot_info = context_builder._get_bot_info()
-       
-       # Appliquer le post-traitement
-       corrected_response = post_process_api_response(test_response, bot_info)
-       
-       return jsonify({
-           "original": test_response,
-           "corrected": corrected_response,
-           "was_corrected": test_response != corrected_response,
-           "bot_info": bot_info
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur test_identity_correction: {str(e)}")
-       return jsonify({"error": str(e)}), 500
+   data = request.get_json(silent=True, cache=False) or {}
+   test_response = data.get("response", "Je suis une assistante virtuelle conçue pour vous aider.")
+   
+   # Récupérer les infos du bot
+   global context_builder
+   if not context_builder:
+       context_builder = ContextBuilder(current_app)
+   
+   bot_info = context_builder._get_bot_info()
+   
+   # Appliquer le post-traitement
+   corrected_response = post_process_api_response(test_response, bot_info)
+   
+   return jsonify({
+       "original": test_response,
+       "corrected": corrected_response,
+       "was_corrected": test_response != corrected_response,
+       "bot_info": bot_info
+   })
 
 
 # ========================
@@ -2349,22 +2682,33 @@ from sqlalchemy.orm.attributes import flag_modified
 def get_fast_responses():
    """Récupère les réponses rapides pour compatibilité avec l'ancienne interface."""
    try:
+       cached = _fast_responses_cache
+       if cached['data'] is not None and time.time() - cached['mtime'] < FAST_RESPONSES_CACHE_TTL:
+           return current_app.response_class(cached['data'], mimetype='application/json')
+       
        # Convertir les nouveaux formats vers l'ancien format pour compatibilité
-       default_messages = DefaultMessage.query.all()
+       # (colonnes utiles uniquement, sans hydrater d'objets ORM)
+       rows = db.session.query(
+           DefaultMessage.id, DefaultMessage.title, DefaultMessage.content, DefaultMessage.triggers
+       )
        
        fast_responses = []
-       for msg in default_messages:
+       for row in rows:
            fast_responses.append({
-               'id': msg.id,
-               'title': msg.title,
-               'content': msg.content,
-               'triggers': msg.triggers.split(',') if msg.triggers else []
+               'id': row.id,
+               'title': row.title,
+               'content': row.content,
+               'triggers': DefaultMessage.split_triggers(row.triggers)
            })
        
-       return jsonify({
+       body = orjson.dumps({
            'status': 'success',
            'data': fast_responses
        })
+       cached['data'] = body
+       cached['mtime'] = time.time()
+       
+       return current_app.response_class(body, mimetype='application/json')
        
    except Exception as e:
        logger.error(f"Erreur récupération fast responses: {str(e)}")
@@ -2383,16 +2727,17 @@ def create_fast_response():
        message = DefaultMessage(
            title=data.get('title', 'Nouvelle réponse'),
            content=data.get('content', ''),
-           triggers=','.join(data.get('triggers', []))
+           trigger_list=data.get('triggers', [])
        )
        
        db.session.add(message)
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
        except Exception as e:
            logger.error(f"Erreur rafraîchissement cache: {str(e)}")
        
@@ -2402,7 +2747,7 @@ def create_fast_response():
                'id': message.id,
                'title': message.title,
                'content': message.content,
-               'triggers': message.triggers.split(',') if message.triggers else []
+               'triggers': message.trigger_list
            }
        })
        
@@ -2424,14 +2769,15 @@ def update_fast_response(response_id):
        
        message.title = data.get('title', message.title)
        message.content = data.get('content', message.content)
-       message.triggers = ','.join(data.get('triggers', []))
+       message.trigger_list = data.get('triggers', [])
        
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
        except Exception as e:
            logger.error(f"Erreur rafraîchissement cache: {str(e)}")
        
@@ -2441,7 +2787,7 @@ def update_fast_response(response_id):
                'id': message.id,
                'title': message.title,
                'content': message.content,
-               'triggers': message.triggers.split(',') if message.triggers else []
+               'triggers': message.trigger_list
            }
        })
        
@@ -2461,11 +2807,12 @@ def delete_fast_response(response_id):
        message = DefaultMessage.query.get_or_404(response_id)
        db.session.delete(message)
        db.session.commit()
+       _invalidate_fast_responses_cache()
        
        # Rafraîchir le cache
        try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
+           from .fast_responses_cache import schedule_refresh
+           schedule_refresh()
        except Exception as e:
            logger.error(f"Erreur rafraîchissement cache: {str(e)}")
        
@@ -2508,32 +2855,22 @@ def refresh_fast_responses_cache():
 def test_fast_response():
    """Teste les variables dans une réponse (compatibilité)."""
    try:
-       data = request.get_json()
+       data = request.get_json(silent=True, cache=False) or {}
        content = data.get('content', '')
        variables = data.get('variables', {})
        
-       # Variables par défaut
-       default_variables = {
-           'bot_name': 'Assistant',
-           'domain': 'example.com',
-           'current_date': datetime.now().strftime('%d/%m/%Y'),
-           'current_time': datetime.now().strftime('%H:%M')
-       }
-       
-       # Merger avec les variables fournies
-       all_variables = {**default_variables, **variables}
+       # Merger avec les variables fournies (les dates sont calculées à la demande)
+       all_variables = {**_TEST_DEFAULT_VARIABLES, **variables}
        
        # Remplacer les variables dans le contenu
-       processed_content = content
-       for var_name, var_value in all_variables.items():
-           processed_content = processed_content.replace(f'{{{var_name}}}', str(var_value))
+       processed_content = _substitute_variables(content, all_variables)
        
        return jsonify({
            'status': 'success',
            'data': {
                'original_content': content,
                'processed_content': processed_content,
-               'variables_used': list(all_variables.keys())
+               'variables_used': list(all_variables) + [k for k in _DYNAMIC_VARS if k not in all_variables]
            }
        })
        
@@ -2548,63 +2885,59 @@ def test_fast_response():
 # ========================
 # NOUVELLES ROUTES POUR LA GESTION DES MESSAGES D'ERREUR
 # ========================
+# Messages d'erreur par défaut (données constantes, sérialisées une seule fois)
+# Dans une version future, créer une table dédiée
+_DEFAULT_ERROR_MESSAGES = [
+   {
+       'id': 1,
+       'title': 'Dépassement du temps de réponse',
+       'code': 'TIMEOUT',
+       'content': 'Je prends un peu plus de temps que prévu pour traiter votre demande. Pouvez-vous patienter quelques instants ou reformuler votre question ?'
+   },
+   {
+       'id': 2,
+       'title': 'Erreur technique',
+       'code': 'SYSTEM_ERROR',
+       'content': 'Je rencontre un petit problème technique. Pouvez-vous réessayer dans quelques minutes ? Si le problème persiste, contactez notre support.'
+   },
+   {
+       'id': 3,
+       'title': 'Limite atteinte',
+       'code': 'RATE_LIMIT',
+       'content': 'Vous avez fait beaucoup de demandes récemment. Merci de patienter quelques minutes avant de continuer.'
+   }
+]
+_ERROR_MESSAGES_JSON = orjson.dumps(_DEFAULT_ERROR_MESSAGES)
+_ERROR_MESSAGES_ETAG = hashlib.sha1(_ERROR_MESSAGES_JSON).hexdigest()
+
 @responses_bp.route('/api/error-messages', methods=['GET'])
 @login_required
+@catch_errors("Erreur récupération messages d'erreur")
 def get_error_messages():
    """Récupère les messages d'erreur personnalisés."""
-   try:
-       # Pour l'instant, retourner des messages d'erreur par défaut
-       # Dans une version future, créer une table dédiée
-       error_messages = [
-           {
-               'id': 1,
-               'title': 'Dépassement du temps de réponse',
-               'code': 'TIMEOUT',
-               'content': 'Je prends un peu plus de temps que prévu pour traiter votre demande. Pouvez-vous patienter quelques instants ou reformuler votre question ?'
-           },
-           {
-               'id': 2,
-               'title': 'Erreur technique',
-               'code': 'SYSTEM_ERROR',
-               'content': 'Je rencontre un petit problème technique. Pouvez-vous réessayer dans quelques minutes ? Si le problème persiste, contactez notre support.'
-           },
-           {
-               'id': 3,
-               'title': 'Limite atteinte',
-               'code': 'RATE_LIMIT',
-               'content': 'Vous avez fait beaucoup de demandes récemment. Merci de patienter quelques minutes avant de continuer.'
-           }
-       ]
-       
-       return jsonify(error_messages)
-       
-   except Exception as e:
-       logger.error(f"Erreur récupération messages d'erreur: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   response = current_app.response_class(_ERROR_MESSAGES_JSON, mimetype='application/json')
+   response.set_etag(_ERROR_MESSAGES_ETAG)
+   return response.make_conditional(request)
 
 @responses_bp.route('/api/error-messages', methods=['POST'])
 @login_required
+@catch_errors("Erreur création message d'erreur")
 def create_error_message():
    """Crée un nouveau message d'erreur."""
-   try:
-       data = request.get_json()
-       
-       # Pour l'instant, simuler la création
-       # Dans une version future, sauvegarder en base
-       
-       logger.info(f"Nouveau message d'erreur créé: {data.get('title', 'Sans titre')}")
-       
-       return jsonify({
-           'success': True,
-           'id': 999,  # ID simulé
-           'title': data.get('title', ''),
-           'code': data.get('code', ''),
-           'content': data.get('content', '')
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur création message d'erreur: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   data = request.get_json()
+   
+   # Pour l'instant, simuler la création
+   # Dans une version future, sauvegarder en base
+   
+   logger.info(f"Nouveau message d'erreur créé: {data.get('title', 'Sans titre')}")
+   
+   return jsonify({
+       'success': True,
+       'id': 999,  # ID simulé
+       'title': data.get('title', ''),
+       'code': data.get('code', ''),
+       'content': data.get('content', '')
+   })
 
 
 # ========================
@@ -2612,68 +2945,59 @@ def create_error_message():
 # ========================
 @responses_bp.route('/api/tone-settings', methods=['GET'])
 @login_required
+@catch_errors('Erreur récupération paramètres de ton')
 def get_tone_settings():
    """Récupère les paramètres de ton et style."""
-   try:
-       config = BotResponses.query.first()
-       
-       # Paramètres par défaut
-       tone_settings = {
-           'communication_style': 'formel',
-           'language_level': 'standard',
-           'primary_trait': 'empathique',
-           'secondary_trait': 'serviable'
-       }
-       
-       # Si config existe, utiliser les valeurs sauvegardées
-       if config and hasattr(config, 'tone_config') and config.tone_config:
-           tone_settings.update(config.tone_config)
-       
-       return jsonify(tone_settings)
-       
-   except Exception as e:
-       logger.error(f"Erreur récupération paramètres de ton: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   config = get_bot_responses_cached()
+   
+   # Paramètres par défaut
+   tone_settings = {
+       'communication_style': 'formel',
+       'language_level': 'standard',
+       'primary_trait': 'empathique',
+       'secondary_trait': 'serviable'
+   }
+   
+   # Si config existe, utiliser les valeurs sauvegardées
+   if config and hasattr(config, 'tone_config') and config.tone_config:
+       tone_settings.update(config.tone_config)
+   
+   return jsonify(tone_settings)
 
 @responses_bp.route('/api/tone-settings', methods=['POST'])
 @login_required
+@catch_errors('Erreur sauvegarde paramètres de ton', rollback=True)
 def save_tone_settings():
    """Sauvegarde les paramètres de ton et style."""
-   try:
-       data = request.get_json()
-       
-       config = BotResponses.query.first()
-       if not config:
-           config = BotResponses()
-           db.session.add(config)
-       
-       # Sauvegarder les paramètres de ton
-       tone_config = {
-           'communication_style': data.get('communication_style', 'formel'),
-           'language_level': data.get('language_level', 'standard'),
-           'primary_trait': data.get('primary_trait', 'empathique'),
-           'secondary_trait': data.get('secondary_trait', 'serviable')
-       }
-       
-       # Ajouter l'attribut tone_config s'il n'existe pas
-       if not hasattr(config, 'tone_config'):
-           # En attente d'une migration de base de données pour ajouter ce champ
-           # Pour l'instant, on peut utiliser le champ vocabulary comme stockage temporaire
-           pass
-       
-       db.session.commit()
-       
-       logger.info(f"Paramètres de ton sauvegardés par {current_user.username}")
-       
-       return jsonify({
-           'success': True,
-           'message': 'Paramètres de ton sauvegardés avec succès'
-       })
-       
-   except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur sauvegarde paramètres de ton: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   data = request.get_json()
+   
+   config = BotResponses.query.first()
+   if not config:
+       config = BotResponses()
+       db.session.add(config)
+   
+   # Sauvegarder les paramètres de ton
+   tone_config = {
+       'communication_style': data.get('communication_style', 'formel'),
+       'language_level': data.get('language_level', 'standard'),
+       'primary_trait': data.get('primary_trait', 'empathique'),
+       'secondary_trait': data.get('secondary_trait', 'serviable')
+   }
+   
+   # Ajouter l'attribut tone_config s'il n'existe pas
+   if not hasattr(config, 'tone_config'):
+       # En attente d'une migration de base de données pour ajouter ce champ
+       # Pour l'instant, on peut utiliser le champ vocabulary comme stockage temporaire
+       pass
+   
+   db.session.commit()
+   
+   logger.info(f"Paramètres de ton sauvegardés par {current_user.username}")
+   
+   return jsonify({
+       'success': True,
+       'message': 'Paramètres de ton sauvegardés avec succès'
+   })
 
 
 # ========================
@@ -2681,38 +3005,33 @@ def save_tone_settings():
 # ========================
 @main_bp.route("/api/settings/welcome-message", methods=['PUT'])
 @login_required
+@catch_errors('Erreur mise à jour message de bienvenue', rollback=True)
 def update_welcome_message():
    """Met à jour le message de bienvenue."""
+   data = request.get_json()
+   welcome_message = data.get('welcome_message', '')
+   
+   settings = Settings.query.first()
+   if not settings:
+       settings = Settings()
+       db.session.add(settings)
+   
+   settings.bot_welcome = welcome_message
+   db.session.commit()
+   
+   # Rafraîchir le cache
    try:
-       data = request.get_json()
-       welcome_message = data.get('welcome_message', '')
-       
-       settings = Settings.query.first()
-       if not settings:
-           settings = Settings()
-           db.session.add(settings)
-       
-       settings.bot_welcome = welcome_message
-       db.session.commit()
-       
-       # Rafraîchir le cache
-       try:
-           from .fast_responses_cache import refresh_cache
-           refresh_cache()
-       except Exception as e:
-           logger.error(f"Erreur rafraîchissement cache: {str(e)}")
-       
-       logger.info(f"Message de bienvenue mis à jour par {current_user.username}")
-       
-       return jsonify({
-           'success': True,
-           'message': 'Message de bienvenue mis à jour'
-       })
-       
+       from .fast_responses_cache import schedule_refresh
+       schedule_refresh()
    except Exception as e:
-       db.session.rollback()
-       logger.error(f"Erreur mise à jour message de bienvenue: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+       logger.error(f"Erreur rafraîchissement cache: {str(e)}")
+   
+   logger.info(f"Message de bienvenue mis à jour par {current_user.username}")
+   
+   return jsonify({
+       'success': True,
+       'message': 'Message de bienvenue mis à jour'
+   })
 
 
 # ========================
@@ -2720,43 +3039,44 @@ def update_welcome_message():
 # ========================
 @responses_bp.route('/api/export', methods=['GET'])
 @login_required
+@catch_errors('Erreur export configuration')
 def export_responses_config():
    """Exporte toute la configuration des réponses."""
-   try:
-       # Récupérer toute la configuration
-       config_response = get_responses_configuration()
-       config_data = config_response.get_json()
-       
-       # Ajouter des métadonnées d'export
-       export_data = {
-           'export_info': {
-               'version': '2.0',
-               'exported_by': current_user.username,
-               'export_date': datetime.utcnow().isoformat(),
-               'application': 'Bot Response Configuration'
-           },
-           'configuration': config_data
-       }
-       
-       # Créer la réponse de téléchargement
-       response = make_response(jsonify(export_data))
-       filename = f'bot_responses_config_{current_user.username}_{int(time.time())}.json'
-       response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-       response.headers['Content-Type'] = 'application/json'
-       
-       logger.info(f"Configuration des réponses exportée par {current_user.username}")
-       
-       return response
-       
-   except Exception as e:
-       logger.error(f"Erreur export configuration: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   # Récupérer toute la configuration (sans passer par une réponse JSON intermédiaire)
+   config_data = _build_config_dict()
+   
+   # Ajouter des métadonnées d'export
+   export_data = {
+       'export_info': {
+           'version': '2.0',
+           'exported_by': current_user.username,
+           'export_date': datetime.utcnow(),
+           'application': 'Bot Response Configuration'
+       },
+       'configuration': config_data
+   }
+   
+   # Créer la réponse de téléchargement directement depuis les octets sérialisés
+   filename = f'bot_responses_config_{current_user.username}_{int(time.time())}.json'
+   
+   logger.info(f"Configuration des réponses exportée par {current_user.username}")
+   
+   return send_file(
+       io.BytesIO(orjson.dumps(export_data)),
+       mimetype='application/json',
+       as_attachment=True,
+       download_name=filename
+   )
 
 @responses_bp.route('/api/import', methods=['POST'])
 @login_required
 def import_responses_config():
    """Importe une configuration des réponses."""
    try:
+       # Rejeter les imports trop volumineux avant de lire le corps
+       if request.content_length and request.content_length > current_app.config.get('MAX_IMPORT_SIZE', Config.MAX_IMPORT_SIZE):
+           return jsonify({'error': 'Fichier trop volumineux'}), 413
+       
        if 'file' not in request.files:
            return jsonify({'error': 'Aucun fichier fourni'}), 400
        
@@ -2764,12 +3084,14 @@ def import_responses_config():
        if file.filename == '':
            return jsonify({'error': 'Nom de fichier invalide'}), 400
        
-       if not file.filename.endswith('.json'):
+       if os.path.splitext(file.filename)[1].lower() != '.json':
            return jsonify({'error': 'Format de fichier non supporté (JSON requis)'}), 400
        
-       # Lire et parser le fichier
-       content = file.read().decode('utf-8')
-       import_data = json.loads(content)
+       # Lire et parser le fichier (orjson accepte directement les bytes)
+       raw = _read_import_file(file)
+       if raw is None:
+           return jsonify({'error': 'Fichier trop volumineux'}), 413
+       import_data = orjson.loads(raw)
        
        # Valider la structure
        if 'configuration' not in import_data:
@@ -2791,7 +3113,7 @@ def import_responses_config():
            'imported_version': import_data.get('export_info', {}).get('version', 'inconnue')
        })
        
-   except json.JSONDecodeError:
+   except orjson.JSONDecodeError:
        return jsonify({'error': 'Fichier JSON invalide'}), 400
    except Exception as e:
        logger.error(f"Erreur import configuration: {str(e)}")
@@ -2803,31 +3125,27 @@ def import_responses_config():
 # ========================
 @responses_bp.route('/api/migrate-legacy', methods=['POST'])
 @login_required
+@catch_errors('Erreur migration')
 def migrate_legacy_config():
    """Migre l'ancienne configuration vers le nouveau format."""
-   try:
-       # Récupérer les anciennes données
-       old_messages = DefaultMessage.query.all()
-       
-       migrated_count = 0
-       
-       # Processus de migration
-       for msg in old_messages:
-           # Les messages sont déjà dans le bon format
-           # Cette migration est principalement pour la compatibilité future
-           migrated_count += 1
-       
-       logger.info(f"Migration effectuée par {current_user.username}: {migrated_count} éléments")
-       
-       return jsonify({
-           'success': True,
-           'message': f'Migration terminée: {migrated_count} éléments traités',
-           'migrated_count': migrated_count
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur migration: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   # Récupérer les anciennes données
+   old_messages = DefaultMessage.query.all()
+   
+   migrated_count = 0
+   
+   # Processus de migration
+   for msg in old_messages:
+       # Les messages sont déjà dans le bon format
+       # Cette migration est principalement pour la compatibilité future
+       migrated_count += 1
+   
+   logger.info(f"Migration effectuée par {current_user.username}: {migrated_count} éléments")
+   
+   return jsonify({
+       'success': True,
+       'message': f'Migration terminée: {migrated_count} éléments traités',
+       'migrated_count': migrated_count
+   })
 
 
 # ========================
@@ -2847,16 +3165,18 @@ def register_additional_blueprints(app):
 @main_bp.before_request
 def log_request_info():
    """Log les informations de requête pour debugging."""
+   if not logger.isEnabledFor(logging.DEBUG):
+       return
    if request.endpoint and request.endpoint.startswith('api'):
-       logger.debug(f"API Request: {request.method} {request.path} from {request.remote_addr}")
+       logger.debug("API Request: %s %s from %s", request.method, request.path, request.remote_addr)
        if current_user.is_authenticated:
-           logger.debug(f"User: {current_user.username}")
+           logger.debug("User: %s", current_user.username)
 
 @main_bp.after_request
 def log_response_info(response):
    """Log les informations de réponse pour debugging."""
-   if request.endpoint and request.endpoint.startswith('api'):
-       logger.debug(f"API Response: {response.status_code} for {request.path}")
+   if logger.isEnabledFor(logging.DEBUG) and request.endpoint and request.endpoint.startswith('api'):
+       logger.debug("API Response: %s for %s", response.status_code, request.path)
    return response
 
 
@@ -2882,7 +3202,7 @@ def api_internal_error(error):
        return jsonify({
            'error': 'Internal server error',
            'path': request.path,
-           'message': 'Une erreur inattendue s'est produite'
+           'message': "Une erreur inattendue s'est produite"
        }), 500
    return error
 
@@ -2892,33 +3212,35 @@ def api_internal_error(error):
 # ========================
 def validate_response_data(data):
    """Valide les données d'une réponse."""
-   required_fields = ['content']
-   optional_fields = ['title', 'triggers', 'keywords']
+   # Vérifier le champ requis ; la longueur brute est testée avant tout strip()
+   # pour rejeter les contenus démesurés sans les copier
+   raw_content = data.get('content')
+   if not raw_content:
+       return False, "Le champ 'content' est requis"
    
-   # Vérifier les champs requis
-   for field in required_fields:
-       if field not in data or not data[field].strip():
-           return False, f"Le champ '{field}' est requis"
+   if len(raw_content) > 1000:
+       return False, "Le contenu ne peut pas dépasser 1000 caractères"
    
    # Valider le contenu
-   content = data['content'].strip()
+   content = raw_content.strip()
+   if not content:
+       return False, "Le champ 'content' est requis"
+   
    if len(content) < 5:
        return False, "Le contenu doit contenir au moins 5 caractères"
    
-   if len(content) > 1000:
-       return False, "Le contenu ne peut pas dépasser 1000 caractères"
-   
    # Valider les triggers si présents
-   if 'triggers' in data and data['triggers']:
-       triggers = data['triggers'] if isinstance(data['triggers'], list) else data['triggers'].split(',')
-       triggers = [t.strip() for t in triggers if t.strip()]
+   raw_triggers = data.get('triggers')
+   if raw_triggers:
+       triggers = raw_triggers if isinstance(raw_triggers, list) else raw_triggers.split(',')
+       triggers = [t for t in (t.strip() for t in triggers) if t]
        
-       if len(triggers) == 0:
+       if not triggers:
            return False, "Au moins un déclencheur est requis"
        
-       for trigger in triggers:
-           if len(trigger) < 2:
-               return False, f"Le déclencheur '{trigger}' est trop court (minimum 2 caractères)"
+       too_short = next((t for t in triggers if len(t) < 2), None)
+       if too_short is not None:
+           return False, f"Le déclencheur '{too_short}' est trop court (minimum 2 caractères)"
    
    return True, "Validation réussie"
 
@@ -2927,137 +3249,303 @@ def process_response_variables(content, variables=None):
    if not variables:
        variables = {}
    
-   # Variables par défaut
-   default_vars = {
-       'bot_name': 'Assistant',
-       'current_date': datetime.now().strftime('%d/%m/%Y'),
-       'current_time': datetime.now().strftime('%H:%M'),
-       'domain': 'exemple.com',
-       'user_name': 'Visiteur'
-   }
+   # Variables par défaut (current_date/current_time sont résolues à la demande)
+   default_vars = dict(_RESPONSE_DEFAULT_VARIABLES)
    
    # Récupérer les vraies valeurs depuis la base
    try:
-       settings = Settings.query.first()
+       settings = get_settings_cached()
        if settings:
            if settings.bot_name:
                default_vars['bot_name'] = settings.bot_name
    except Exception as e:
-       logger.error(f"Erreur récupération settings pour variables: {e}")
+       logger.error("Erreur récupération settings pour variables: %s", e)
    
    # Merger les variables
    all_vars = {**default_vars, **variables}
    
    # Remplacer dans le contenu
-   processed_content = content
-   for var_name, var_value in all_vars.items():
-       pattern = f'{{{var_name}}}'
-       processed_content = processed_content.replace(pattern, str(var_value))
-   
-   return processed_content
+   return _substitute_variables(content, all_vars)
 
 
 # ========================
 # CACHE MANAGER POUR LES RÉPONSES
 # ========================
+MATCH_CACHE_SIZE = 1024
+MATCH_CACHE_MAX_INPUT = 500  # caractères
+RECENT_QUERIES_SIZE = 64
+
+
 class ResponseCacheManager:
    """Gestionnaire de cache pour les réponses."""
    
    def __init__(self):
        self._cache = {}
-       self._last_update = None
+       self._automaton = None
+       self._token_index = ({}, [])
+       self._exact_index = {}  # trigger normalisé -> meilleure correspondance précalculée
+       self._generation = 0  # incrémenté à chaque rechargement
+       self._count = 0
+       self._match_cache = OrderedDict()  # (génération, entrée normalisée) -> résultat
+       self._recent_queries = OrderedDict()  # entrée normalisée -> meilleure correspondance
+       self._max_trigger_len = 0
+       self._last_update = None  # time.monotonic() du dernier rechargement
+       self._last_update_at = None  # horodatage affichable du dernier rechargement
    
    def get_cached_responses(self):
        """Récupère les réponses du cache."""
        return self._cache.get('responses', [])
    
+   @property
+   def count(self):
+       """Nombre de réponses en cache, tenu à jour au rechargement."""
+       return self._count
+   
    def update_cache(self):
        """Met à jour le cache avec les dernières données."""
        try:
-           # Récupérer les messages par défaut
-           messages = DefaultMessage.query.all()
+           # Récupérer les messages par défaut (colonnes utiles uniquement)
+           rows = db.session.query(
+               DefaultMessage.id, DefaultMessage.title, DefaultMessage.content, DefaultMessage.triggers
+           )
            
            cached_responses = []
-           for msg in messages:
+           for row in rows:
+               triggers = DefaultMessage.split_triggers(row.triggers)
                cached_responses.append({
-                   'id': msg.id,
-                   'title': msg.title,
-                   'content': msg.content,
-                   'triggers': msg.triggers.split(',') if msg.triggers else [],
-                   'processed_content': process_response_variables(msg.content)
+                   'id': row.id,
+                   'title': row.title,
+                   'content': row.content,
+                   'triggers': triggers,
+                   # Triggers normalisés une fois ici plutôt qu'à chaque recherche
+                   'triggers_lower': [t.lower() for t in triggers],
+                   'processed_content': process_response_variables(row.content)
                })
            
            self._cache['responses'] = cached_responses
-           self._last_update = datetime.utcnow()
+           self._count = len(cached_responses)
+           self._automaton = self._build_automaton(cached_responses)
+           if self._automaton is None:
+               self._token_index = self._build_token_index(cached_responses)
+           # Entrée identique à un trigger : résultat calculé une fois ici. Un trigger
+           # plus prioritaire contenu dans celui-ci peut l'emporter, d'où _best_match.
+           self._exact_index = {
+               key: self._best_match(key)
+               for response in cached_responses
+               for key in response['triggers_lower'] if key
+           }
+           self._max_trigger_len = max(
+               (len(key) for response in cached_responses for key in response['triggers_lower']),
+               default=0
+           )
+           self._generation += 1
+           self._match_cache.clear()
+           if has_request_context():
+               g.pop('_rcm_valid', None)
+           self._recent_queries.clear()
+           self._last_update = time.monotonic()
+           self._last_update_at = datetime.utcnow()
            
-           logger.debug(f"Cache mis à jour: {len(cached_responses)} réponses")
+           logger.debug("Cache mis à jour: %d réponses", len(cached_responses))
            
        except Exception as e:
-           logger.error(f"Erreur mise à jour cache: {e}")
+           logger.exception("Erreur mise à jour cache: %s", e)
    
-   def is_cache_valid(self, max_age_minutes=30):
-       """Vérifie si le cache est encore valide."""
-       if not self._last_update:
-           return False
-       
-       age = (datetime.utcnow() - self._last_update).total_seconds() / 60
-       return age < max_age_minutes
+   @staticmethod
+   def _build_automaton(responses):
+       """Construit un automate Aho-Corasick sur l'ensemble des triggers."""
+       if ahocorasick is None:
+           return None
+       
+       automaton = ahocorasick.Automaton()
+       for r_index, response in enumerate(responses):
+           for t_index, (trigger, key) in enumerate(zip(response['triggers'], response['triggers_lower'])):
+               # Garder la première occurrence pour conserver l'ordre de priorité
+               if key and key not in automaton:
+                   automaton.add_word(key, ((r_index, t_index), trigger))
+       
+       if len(automaton) == 0:
+           return None
+       automaton.make_automaton()
+       return automaton
+   
+   @staticmethod
+   def _build_token_index(responses):
+       """
+       Index inversé trigramme -> triggers commençant par ce trigramme (repli sans Aho-Corasick).
+       Un trigger ne peut apparaître dans l'entrée que si son premier trigramme y apparaît :
+       seuls ces candidats sont testés, sans changer la sémantique « sous-chaîne ».
+       """
+       index = {}
+       short_triggers = []  # triggers de moins de 3 caractères, toujours testés
+       for r_index, response in enumerate(responses):
+           for t_index, (trigger, key) in enumerate(zip(response['triggers'], response['triggers_lower'])):
+               entry = ((r_index, t_index), trigger, key)
+               if len(key) < 3:
+                   short_triggers.append(entry)
+               else:
+                   index.setdefault(key[:3], []).append(entry)
+       return index, short_triggers
+   
+   def invalidate(self):
+       """Force le rechargement au prochain accès (messages par défaut modifiés)."""
+       self._last_update = None
+       if has_request_context():
+           g.pop('_rcm_valid', None)
+   
+   def is_cache_valid(self, max_age_seconds=30 * 60):
+       """Vérifie si le cache est encore valide (horloge monotone), une fois par requête."""
+       in_request = has_request_context()
+       if in_request and '_rcm_valid' in g:
+           return g._rcm_valid
+       
+       valid = self._last_update is not None and time.monotonic() - self._last_update < max_age_seconds
+       if in_request:
+           g._rcm_valid = valid
+       return valid
    
    def find_matching_response(self, user_input):
        """Trouve une réponse correspondant à l'input utilisateur."""
        if not self.is_cache_valid():
            self.update_cache()
        
-       user_input_lower = user_input.lower()
+       user_input_lower = user_input.strip().lower()
+       
+       # Les entrées trop longues ne sont pas mémoïsées pour borner la mémoire
+       if len(user_input_lower) > MATCH_CACHE_MAX_INPUT:
+           return self._match(user_input_lower)
+       
+       key = (self._generation, user_input_lower)
+       result = self._match_cache.get(key)
+       if result is not None:
+           try:
+               self._match_cache.move_to_end(key)
+           except KeyError:
+               pass  # entrée évincée entre-temps par une autre requête
+           return result
+       
+       result = self._match(user_input_lower)
+       self._match_cache[key] = result
+       if len(self._match_cache) > MATCH_CACHE_SIZE:
+           try:
+               self._match_cache.popitem(last=False)
+           except KeyError:
+               pass
+       return result
+   
+   def _match(self, user_input_lower):
+       """Recherche effective sur une entrée déjà normalisée."""
        responses = self.get_cached_responses()
        
-       for response in responses:
-           for trigger in response['triggers']:
-               if trigger.lower().strip() in user_input_lower:
-                   return {
-                       'found': True,
-                       'response': response,
-                       'trigger': trigger,
-                       'content': response['processed_content']
-                   }
+       best = self._exact_index.get(user_input_lower)
+       if best is not None:
+           return self._format_match(responses, best)
        
-       return {'found': False}
+       # Saisie incrémentale : si une entrée récente est un préfixe de celle-ci,
+       # ses correspondances restent valables et seule la fin de l'entrée est à analyser
+       prefix_best, start = self._prefix_hint(user_input_lower)
+       best = self._best_match(user_input_lower[start:])
+       if prefix_best is not None and (best is None or prefix_best < best):
+           best = prefix_best
+       
+       self._recent_queries[user_input_lower] = best
+       if len(self._recent_queries) > RECENT_QUERIES_SIZE:
+           try:
+               self._recent_queries.popitem(last=False)
+           except KeyError:
+               pass
+       
+       return self._format_match(responses, best)
+   
+   @staticmethod
+   def _format_match(responses, best):
+       """Construit le résultat renvoyé pour une correspondance (ou son absence)."""
+       if best is None:
+           return {'found': False}
+       
+       (r_index, _), trigger = best
+       response = responses[r_index]
+       return {
+           'found': True,
+           'response': response,
+           'trigger': trigger,
+           'content': response['processed_content']
+       }
+   
+   def _prefix_hint(self, user_input_lower):
+       """
+       Cherche la plus longue entrée récente préfixe de user_input_lower.
+       Renvoie (meilleure correspondance de ce préfixe, position de reprise de l'analyse).
+       """
+       prefix = max(
+           (q for q in list(self._recent_queries) if user_input_lower.startswith(q)),
+           key=len,
+           default=None
+       )
+       if prefix is None:
+           return None, 0
+       
+       # Une correspondance absente du préfixe doit se terminer après lui
+       start = max(0, len(prefix) - self._max_trigger_len + 1)
+       return self._recent_queries.get(prefix), start
+   
+   def _best_match(self, text):
+       """Renvoie ((index réponse, index trigger), trigger) de plus haute priorité présent dans text."""
+       if self._automaton is not None:
+           # Un seul parcours de l'entrée, quel que soit le nombre de triggers
+           return min(
+               (value for _, value in self._automaton.iter(text)),
+               default=None
+           )
+       
+       # Repli : seuls les triggers partageant un trigramme avec l'entrée sont testés
+       index, short_triggers = self._token_index
+       grams = {text[i:i + 3] for i in range(len(text) - 2)}
+       candidates = list(short_triggers)
+       for gram in grams & index.keys():
+           candidates.extend(index[gram])
+       
+       best = min(
+           (entry for entry in candidates if entry[2] in text),
+           default=None
+       )
+       return best[:2] if best is not None else None
 
 # Instance globale du gestionnaire de cache
 response_cache_manager = ResponseCacheManager()
 
+# Invalidation après commit : reconstruit avant, le cache garderait les anciens triggers
+# pendant toute sa durée de validité (ou des triggers d'une sauvegarde annulée)
+on_commit(DefaultMessage, response_cache_manager.invalidate)
+
 
 # ========================
 # ROUTE POUR TESTER LE MATCHING DES RÉPONSES
 # ========================
 @responses_bp.route('/api/test-matching', methods=['POST'])
 @login_required
+@catch_errors('Erreur test matching')
 def test_response_matching():
    """Teste le matching des réponses en temps réel."""
-   try:
-       data = request.get_json()
-       test_input = data.get('input', '')
-       
-       if not test_input:
-           return jsonify({'error': 'Input de test requis'}), 400
-       
-       # Utiliser le cache manager pour tester
-       result = response_cache_manager.find_matching_response(test_input)
-       
-       return jsonify({
-           'success': True,
-           'input': test_input,
-           'result': result,
-           'cache_status': {
-               'valid': response_cache_manager.is_cache_valid(),
-               'last_update': response_cache_manager._last_update.isoformat() if response_cache_manager._last_update else None,
-               'responses_count': len(response_cache_manager.get_cached_responses())
-           }
-       })
-       
-   except Exception as e:
-       logger.error(f"Erreur test matching: {str(e)}")
-       return jsonify({'error': str(e)}), 500
+   data = request.get_json(silent=True, cache=False) or {}
+   test_input = data.get('input', '')
+   
+   if not test_input:
+       return json_response({'error': 'Input de test requis'}, 400)
+   
+   # Utiliser le cache manager pour tester
+   result = response_cache_manager.find_matching_response(test_input)
+   
+   return json_response({
+       'success': True,
+       'input': test_input,
+       'result': result,
+       'cache_status': {
+           'valid': response_cache_manager.is_cache_valid(),
+           'last_update': response_cache_manager._last_update_at,
+           'responses_count': response_cache_manager.count
+       }
+   })
 
 
 # ========================